@@ -5,6 +5,7 @@ State management, monitoring, and server reporting are owned by the FIMAdmin ser
 """
 import os
 import sys
+import multiprocessing
 from pathlib import Path
 
 
@@ -100,4 +101,5 @@ def main():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
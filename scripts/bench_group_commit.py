@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event queue persistence throughput vs group-commit window.
+Appends a burst of encrypted events to the EventLog the way the change
+pipeline does (buffered, then made durable before the queue is drained) and
+reports events/s and fsyncs for each commit window. A window of 0 is the
+old behaviour: one write + fsync per event. A second table has several
+producer threads each waiting for durability, sharing fsyncs.
+
+    python scripts/bench_group_commit.py
+    python scripts/bench_group_commit.py --events 5000 --windows 0 0.001 0.005 0.02 --batch 512
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.event_log import EventLog
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:
+    Fernet = None
+
+
+def make_cipher():
+    if Fernet is None:
+        return (lambda data: data), (lambda data: data)
+    f = Fernet(Fernet.generate_key())
+    return f.encrypt, f.decrypt
+
+
+def make_event(i):
+    """Roughly the size of a FileMonitor event with a short Merkle proof"""
+    return {
+        'id': i,
+        'event_type': 'modified',
+        'file_path': f"/srv/data/dir{i % 100:03d}/file{i}.txt",
+        'old_hash': os.urandom(32).hex(),
+        'new_hash': os.urandom(32).hex(),
+        'root_hash': os.urandom(32).hex(),
+        'merkle_proof': {'path': [os.urandom(32).hex() for _ in range(16)], 'index': i},
+        'event_hash': os.urandom(32).hex(),
+        'signature': os.urandom(256).hex()
+    }
+
+
+def run_burst(directory, events, window, batch):
+    """Single producer, durability required before the burst is reported"""
+    encrypt, decrypt = make_cipher()
+    log = EventLog(directory, encrypt, decrypt, commit_window=window, commit_batch=batch)
+    start = time.perf_counter()
+    for event in events:
+        ticket = log.append(event)
+        if not window:
+            log.sync(ticket)
+    log.sync()
+    elapsed = time.perf_counter() - start
+    syncs = log.syncs
+    log.close()
+    return elapsed, syncs
+
+
+def run_concurrent(directory, events, threads, grouped):
+    """Producers each wait for their own event to be durable"""
+    encrypt, decrypt = make_cipher()
+    log = EventLog(directory, encrypt, decrypt, commit_window=0)
+    append_lock = threading.Lock()   # stands in for FIMState.lock
+    per_thread = len(events) // threads
+
+    def producer(chunk):
+        for event in chunk:
+            with append_lock:
+                ticket = log.append(event)
+                if not grouped:
+                    log.sync(ticket)
+            log.sync(ticket)
+
+    workers = [threading.Thread(target=producer, args=(events[i * per_thread:(i + 1) * per_thread],))
+               for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    syncs = log.syncs
+    log.close()
+    return elapsed, syncs, per_thread * threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event log group commit benchmark")
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--windows', type=float, nargs='+', default=[0, 0.001, 0.002, 0.005, 0.01, 0.05])
+    parser.add_argument('--batch', type=int, default=256, help="events that force a group fsync")
+    parser.add_argument('--threads', type=int, default=8, help="producers in the concurrent run")
+    parser.add_argument('--dir', default=None, help="parent for the temporary log (pick the real disk)")
+    args = parser.parse_args()
+
+    events = [make_event(i) for i in range(1, args.events + 1)]
+    work = tempfile.mkdtemp(prefix='fim-bench-', dir=args.dir)
+    try:
+        print(f"burst of {args.events} events, batch limit {args.batch}"
+              f"{'' if Fernet else ' (cryptography missing: records unencrypted)'}")
+        print(f"{'window (s)':>10} {'events/s':>10} {'fsyncs':>8} {'seconds':>9}")
+        baseline = None
+        for i, window in enumerate(args.windows):
+            elapsed, syncs = run_burst(os.path.join(work, f"burst{i}"), events, window, args.batch)
+            rate = args.events / elapsed
+            baseline = baseline or rate
+            print(f"{window:10.3f} {rate:10.0f} {syncs:8} {elapsed:9.3f}  ({rate / baseline:.1f}x)")
+
+        print(f"\n{args.threads} producers, each waiting for durability")
+        print(f"{'mode':>10} {'events/s':>10} {'fsyncs':>8} {'seconds':>9}")
+        for mode, grouped in (('per-event', False), ('grouped', True)):
+            elapsed, syncs, total = run_concurrent(os.path.join(work, mode), events, args.threads, grouped)
+            print(f"{mode:>10} {total / elapsed:10.0f} {syncs:8} {elapsed:9.3f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event drain throughput with and without pooled HTTPS connections.
+Sends events (report + acknowledge, as EventQueueManager does) through
+NetworkClient to a local HTTPS stand-in server, once with a new connection
+per request (module-level requests.post, the old behaviour) and once over
+the shared keep-alive session, and reports events/s and TLS connections.
+
+    python scripts/bench_http_session.py
+    python scripts/bench_http_session.py --events 2000
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from types import SimpleNamespace
+
+import requests
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.network_client import NetworkClient
+from core.registration_client import RegistrationClient
+from fim_standin_server import StandInHTTPSServer
+
+
+class PerRequest:
+    """The old transport: every call opens its own TCP+TLS connection"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def post(self, path, **kwargs):
+        kwargs.setdefault('verify', self.config.server_cert)
+        return requests.post(f"{self.config.server_url}{path}", **kwargs)
+
+    def reset(self):
+        pass
+
+
+def make_event(i):
+    return {
+        'id': i,
+        'event_type': 'modified',
+        'file_path': f"/srv/data/file{i}.txt",
+        'old_hash': os.urandom(32).hex(),
+        'new_hash': os.urandom(32).hex(),
+        'root_hash': os.urandom(32).hex()
+    }
+
+
+def drain(server, events, pooled):
+    config = SimpleNamespace(server_url=server.url, server_cert=server.cert_path, host_id='bench-client',
+                             http_pool_size=4, logger=logging.getLogger('bench'))
+    conn = RegistrationClient(config, SimpleNamespace())
+    if not pooled:
+        conn.http = PerRequest(config)
+    client = NetworkClient(config, conn, lambda msg: None, None)
+
+    before = server.connections
+    start = time.perf_counter()
+    for event in events:
+        result = client.send_event_to_server(event)
+        assert result['success'], result
+        assert client.send_acknowledgement(result['event_id'], result['validation'])
+    elapsed = time.perf_counter() - start
+    conn.http.reset()
+    return len(events) / elapsed, server.connections - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTPS connection pooling benchmark")
+    parser.add_argument('--events', type=int, default=500)
+    args = parser.parse_args()
+
+    server = StandInHTTPSServer().start()
+    try:
+        events = [make_event(i) for i in range(1, args.events + 1)]
+        print(f"{args.events} events (report + ack each) to {server.url}")
+        print(f"{'transport':>12} {'events/s':>10} {'connections':>12}")
+        for name, pooled in (('per-request', False), ('session', True)):
+            rate, connections = drain(server, events, pooled)
+            print(f"{name:>12} {rate:10.0f} {connections:12}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: FIMState.lock contention while events are being enqueued.
+A producer enqueues a burst (as FileMonitor does, wait=False) while a status
+thread polls get_queue_size()/peek_event() like the sender and GUI. Reports
+the status call latency and per-site lock hold times (via the lock_observer
+hook) with the signing pipeline, and with the lock held across signing and
+the append (the old enqueue_event).
+
+    python scripts/bench_lock_hold.py
+    python scripts/bench_lock_hold.py --events 2000 --key-type ed25519
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.state import FIMState
+from core.lock_timing import LockStats
+
+
+def make_event(i):
+    return {
+        'event_type': 'modified',
+        'file_path': f"/srv/data/file{i}.txt",
+        'old_hash': os.urandom(32).hex(),
+        'new_hash': os.urandom(32).hex(),
+        'root_hash': os.urandom(32).hex()
+    }
+
+
+def run(state_dir, events, key_type, inline):
+    os.makedirs(state_dir)
+    stats = LockStats()
+    state = FIMState(os.path.join(state_dir, 'state.json'), key_type=key_type, lock_observer=stats)
+    stats.sites.clear()
+    done = threading.Event()
+    latencies = []
+
+    def status():
+        while not done.is_set():
+            start = time.perf_counter()
+            state.get_queue_size()
+            state.peek_event()
+            latencies.append(time.perf_counter() - start)
+            time.sleep(0.0005)
+
+    poller = threading.Thread(target=status)
+    poller.start()
+    start = time.perf_counter()
+    for i in range(events):
+        if inline:
+            with state.lock:
+                state.enqueue_event(make_event(i), wait=False)
+                state._drain_pipeline()
+        else:
+            state.enqueue_event(make_event(i), wait=False)
+    state.flush_events()
+    elapsed = time.perf_counter() - start
+    done.set()
+    poller.join()
+    assert state.validate_queue_integrity(full=True)
+    state.event_log.close()
+
+    latencies.sort()
+    return events / elapsed, latencies, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="State lock contention benchmark")
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--key-type', default='rsa', choices=('rsa', 'ed25519'))
+    parser.add_argument('--dir', default=None, help="parent for the temporary state")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='fim-bench-', dir=args.dir)
+    try:
+        print(f"{args.events} events, {args.key_type} device key")
+        for name, inline in (('lock held across signing', True), ('signing pipeline', False)):
+            rate, latencies, stats = run(os.path.join(work, str(inline)), args.events, args.key_type, inline)
+            n = len(latencies)
+            ms = 1000
+            print(f"\n{name}: {rate:.0f} events/s; status call p50 {latencies[n // 2] * ms:.3f} ms, "
+                  f"p99 {latencies[int(n * 0.99)] * ms:.3f} ms, max {latencies[-1] * ms:.3f} ms ({n} calls)")
+            print(stats.report())
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: resident memory of the Merkle tree and its file table.
+Compares the array-backed MerkleTree with the original layout (a list of
+(path, hash) tuples plus one list of 32-byte bytes objects per level),
+measuring what each structure retains once its input has been released.
+
+    python scripts/bench_merkle_memory.py
+    python scripts/bench_merkle_memory.py --files 200000
+"""
+import os
+import sys
+import gc
+import hashlib
+import argparse
+import tracemalloc
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.merkle import MerkleTree
+
+
+def make_files(count):
+    """Sorted (path, hash) tuples, 20 files per directory"""
+    files = [
+        (f"/srv/data/project{i // 20000:03d}/module{i // 20 % 1000:03d}/file_{i:08d}.dat",
+         hashlib.sha256(str(i).encode()).digest())
+        for i in range(count)
+    ]
+    files.sort(key=lambda x: x[0])
+    return files
+
+
+def legacy_build(files):
+    """The pre-compaction layout: tuple file table plus per-level digest lists"""
+    leaves = [h for _, h in files]
+    tree = [leaves]
+    current_level = leaves
+    while len(current_level) > 1:
+        next_level = []
+        for i in range(0, len(current_level), 2):
+            left = current_level[i]
+            right = current_level[i + 1] if i + 1 < len(current_level) else left
+            next_level.append(hashlib.sha256(left + right).digest())
+        tree.insert(0, next_level)
+        current_level = next_level
+    return tree, files
+
+
+def measure(count, build):
+    """Bytes still allocated by build()'s result after its input is dropped"""
+    gc.collect()
+    tracemalloc.start()
+    files = make_files(count)
+    result = build(files)
+    del files
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merkle tree memory benchmark")
+    parser.add_argument('--files', type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    legacy = measure(args.files, legacy_build)
+    compact = measure(args.files, MerkleTree.from_sorted)
+
+    mb = 1024 * 1024
+    print(f"files:   {args.files}")
+    print(f"legacy:  {legacy / mb:8.1f} MiB ({legacy / args.files:6.1f} B/file)")
+    print(f"compact: {compact / mb:8.1f} MiB ({compact / args.files:6.1f} B/file)")
+    print(f"saving:  {100 * (1 - compact / legacy):7.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-event Merkle cost for modify/create/delete.
+Compares the incremental update path used by FileMonitor against a full
+build_merkle_tree() rebuild, for trees from 1k to 1M leaves.
+
+    python scripts/bench_merkle_updates.py
+    python scripts/bench_merkle_updates.py --sizes 1000 100000 --events 500
+"""
+import os
+import sys
+import time
+import random
+import gc
+import hashlib
+import argparse
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.merkle import MerkleTree, build_merkle_tree, get_merkle_path
+
+
+def make_files(count):
+    return [(f"/bench/dir{i % 997}/file{i}.dat", hashlib.sha256(str(i).encode()).digest()) for i in range(count)]
+
+
+def time_events(count, fn):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return elapsed / count * 1e6  # microseconds per event
+
+
+def bench_size(size, events, rebuild_limit):
+    files = make_files(size)
+    tree, files = build_merkle_tree(files)
+    paths = [path for path, _ in files]
+    created = []
+    rng = random.Random(size)
+    # Let the collector age the freshly built nodes once so the first timed
+    # events do not pay for it
+    gc.collect()
+    new_hash = lambda i: hashlib.sha256(f"new-{i}".encode()).digest()
+
+    def modify(i):
+        tree.set(rng.choice(paths), new_hash(i))
+
+    def create(i):
+        # Spread new paths across the key space so inserts land mid-tree
+        path = f"/bench/dir{rng.randrange(997)}/new{i}.dat"
+        tree.set(path, new_hash(i))
+        created.append(path)
+
+    def delete(i):
+        tree.remove(created[i])
+
+    def prove(i):
+        get_merkle_path(tree, rng.choice(paths))
+
+    results = {
+        'modify': time_events(events, modify),
+        'create': time_events(events, create),
+        'delete': time_events(events, delete),
+        'proof': time_events(events, prove),
+    }
+
+    if size <= rebuild_limit:
+        rebuild_events = max(1, min(events, 20))
+        snapshot = list(tree)
+
+        def rebuild(i):
+            build_merkle_tree(snapshot)
+
+        results['rebuild'] = time_events(rebuild_events, rebuild)
+
+        # The root only depends on the final set of (path, hash) pairs
+        assert MerkleTree.from_sorted(snapshot).root_hash == tree.root_hash
+    else:
+        results['rebuild'] = None
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-event Merkle update benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--events', type=int, default=2000, help="events timed per operation and size")
+    parser.add_argument('--rebuild-limit', type=int, default=100_000,
+                        help="largest tree on which the full-rebuild baseline is timed")
+    args = parser.parse_args()
+
+    print(f"{'leaves':>10} {'modify us':>10} {'create us':>10} {'delete us':>10} {'proof us':>10} {'rebuild us':>12}")
+    for size in args.sizes:
+        r = bench_size(size, args.events, args.rebuild_limit)
+        rebuild = f"{r['rebuild']:12.1f}" if r['rebuild'] is not None else f"{'-':>12}"
+        print(f"{size:>10} {r['modify']:10.1f} {r['create']:10.1f} {r['delete']:10.1f} {r['proof']:10.1f} {rebuild}")
+
+
+if __name__ == "__main__":
+    main()
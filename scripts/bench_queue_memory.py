@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory held by the pending event queue during an outage.
+Enqueues N events carrying full hex Merkle proofs (as FileMonitor does while
+the server is unreachable) and reports what the EventLog retains, with the
+memory window against a window large enough to keep every event resident
+(the old in-memory list). Then drains the queue to check that paging the
+spilled events back in keeps memory flat and preserves order.
+
+    python scripts/bench_queue_memory.py
+    python scripts/bench_queue_memory.py --events 200000 --window 1024 --depth 20
+"""
+import os
+import sys
+import gc
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.event_log import EventLog
+
+
+def make_event(i, depth):
+    return {
+        'id': i,
+        'event_type': 'modified',
+        'file_path': f"/srv/data/dir{i % 1000:03d}/file{i}.log",
+        'old_hash': os.urandom(32).hex(),
+        'new_hash': os.urandom(32).hex(),
+        'root_hash': os.urandom(32).hex(),
+        'merkle_proof': {'path': [os.urandom(32).hex() for _ in range(depth)], 'index': i},
+        'event_hash': os.urandom(32).hex(),
+        'signature': os.urandom(256).hex()
+    }
+
+
+def identity(data):
+    return data
+
+
+def measure(directory, events, depth, window):
+    """Bytes retained after enqueueing, peak while draining, drain time"""
+    gc.collect()
+    tracemalloc.start()
+    log = EventLog(directory, identity, identity, commit_window=0, memory_window=window)
+    for i in range(1, events + 1):
+        log.append(make_event(i, depth))
+    log.sync()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    expected = 1
+    while True:
+        event = log.pop()
+        if event is None:
+            break
+        assert event['id'] == expected, (event['id'], expected)
+        expected += 1
+    drain = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert expected == events + 1
+    log.close()
+    return retained, peak, drain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event queue memory benchmark")
+    parser.add_argument('--events', type=int, default=100_000)
+    parser.add_argument('--window', type=int, default=1024, help="events kept in memory")
+    parser.add_argument('--depth', type=int, default=20, help="Merkle proof length per event")
+    parser.add_argument('--dir', default=None, help="parent for the temporary log")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='fim-bench-', dir=args.dir)
+    try:
+        mb = 1024 * 1024
+        print(f"events: {args.events} (proof depth {args.depth})")
+        print(f"{'':12} {'retained':>10} {'drain peak':>11} {'drain s':>8}")
+        for name, window in (('resident', args.events * 2), (f'window {args.window}', args.window)):
+            retained, peak, drain = measure(os.path.join(work, name.replace(' ', '')),
+                                            args.events, args.depth, window)
+            print(f"{name:12} {retained / mb:8.1f} MiB {peak / mb:7.1f} MiB {drain:8.2f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-record encryption of queued events.
+Compares the old record encryption (Fernet, with the key re-derived from
+/etc/machine-id on every call) against the AES-GCM record format with its
+cached key, for encrypting and decrypting event-sized records, and reports
+the bytes each adds per record.
+
+    python scripts/bench_record_crypto.py
+    python scripts/bench_record_crypto.py --records 50000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from cryptography.fernet import Fernet
+from core.state import FIMState
+
+
+def make_record(i):
+    return json.dumps({
+        'id': i,
+        'event_type': 'modified',
+        'file_path': f"/srv/data/dir{i % 100:03d}/file{i}.txt",
+        'old_hash': os.urandom(32).hex(),
+        'new_hash': os.urandom(32).hex(),
+        'root_hash': os.urandom(32).hex(),
+        'merkle_proof': {'path': [os.urandom(32).hex() for _ in range(16)], 'index': i},
+        'event_hash': os.urandom(32).hex(),
+        'signature': os.urandom(256).hex()
+    }, separators=(',', ':')).encode('utf-8')
+
+
+def timed(fn, items):
+    start = time.perf_counter()
+    out = [fn(item) for item in items]
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record encryption benchmark")
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--dir', default=None, help="parent for the temporary state")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='fim-bench-', dir=args.dir)
+    try:
+        state = FIMState(os.path.join(work, 'state.json'))
+        records = [make_record(i) for i in range(args.records)]
+        plain = sum(len(r) for r in records)
+
+        def legacy_encrypt(data):
+            return Fernet(state._get_machine_id_key()).encrypt(data)
+
+        def legacy_decrypt(data):
+            return Fernet(state._get_machine_id_key()).decrypt(data)
+
+        print(f"{args.records} records, {plain / args.records:.0f} bytes each")
+        print(f"{'format':>22} {'encrypt/s':>10} {'decrypt/s':>10} {'overhead B':>11}")
+        for name, encrypt, decrypt in (('fernet, key per call', legacy_encrypt, legacy_decrypt),
+                                       ('aes-gcm, cached key', state._encrypt, state._decrypt)):
+            sealed, enc = timed(encrypt, records)
+            opened, dec = timed(decrypt, sealed)
+            assert opened == records
+            overhead = (sum(len(s) for s in sealed) - plain) / args.records
+            print(f"{name:>22} {args.records / enc:10.0f} {args.records / dec:10.0f} {overhead:11.0f}")
+        state.event_log.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark: device event signing throughput, RSA-2048 (PSS) vs Ed25519.
+Signs and verifies payload strings shaped like the ones FIMState.enqueue_event
+signs (event id + prev/last/new hashes), then enqueues a burst through a
+FIMState per key type to show the end-to-end effect on the queue.
+
+    python scripts/bench_signing.py
+    python scripts/bench_signing.py --ops 5000 --events 2000
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.crypto import DeviceSigner, KEY_TYPES
+from core.state import FIMState
+
+
+def make_payload(i):
+    return f"{i}{os.urandom(32).hex()}{os.urandom(32).hex()}{os.urandom(32).hex()}"
+
+
+def bench_signer(key_dir, key_type, ops):
+    """Sign and verify ops/s for one key type"""
+    signer = DeviceSigner(key_dir, key_type=key_type)
+    payloads = [make_payload(i) for i in range(ops)]
+
+    start = time.perf_counter()
+    signatures = [signer.sign_payload(p) for p in payloads]
+    sign_rate = ops / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for payload, signature in zip(payloads, signatures):
+        assert signer.verify_payload(payload, signature)
+    verify_rate = ops / (time.perf_counter() - start)
+    return sign_rate, verify_rate, len(signatures[0]) // 2
+
+
+def bench_enqueue(state_dir, key_type, events):
+    """Events/s through enqueue_event (hash chain + signature + group commit), then validation time"""
+    os.makedirs(state_dir)
+    state = FIMState(os.path.join(state_dir, 'state.json'), key_type=key_type)
+    start = time.perf_counter()
+    for i in range(events):
+        state.enqueue_event({
+            'event_type': 'modified',
+            'file_path': f"/srv/data/file{i}.txt",
+            'old_hash': os.urandom(32).hex(),
+            'new_hash': os.urandom(32).hex(),
+            'root_hash': os.urandom(32).hex()
+        }, wait=False)
+    state.flush_events()
+    rate = events / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    assert state.validate_queue_integrity(full=True)
+    validate = time.perf_counter() - start
+    state.event_log.close()
+    return rate, validate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Device signing benchmark")
+    parser.add_argument('--ops', type=int, default=2000, help="sign/verify operations per key type")
+    parser.add_argument('--events', type=int, default=1000, help="events enqueued per key type")
+    parser.add_argument('--dir', default=None, help="parent for the temporary keys and state")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='fim-bench-', dir=args.dir)
+    try:
+        print(f"{args.ops} payloads")
+        print(f"{'key':>8} {'sign/s':>10} {'verify/s':>10} {'sig bytes':>10}")
+        for key_type in KEY_TYPES:
+            sign_rate, verify_rate, size = bench_signer(os.path.join(work, f"keys-{key_type}"),
+                                                        key_type, args.ops)
+            print(f"{key_type:>8} {sign_rate:10.0f} {verify_rate:10.0f} {size:10}")
+
+        print(f"\n{args.events} events through FIMState.enqueue_event")
+        print(f"{'key':>8} {'events/s':>10} {'full validate s':>16}")
+        for key_type in KEY_TYPES:
+            rate, validate = bench_enqueue(os.path.join(work, f"state-{key_type}"), key_type, args.events)
+            print(f"{key_type:>8} {rate:10.0f} {validate:16.3f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -46,13 +46,11 @@ def main():
         "signature": "FAKED_SIGNATURE_DATA" # This will fail local verification
     }
     
-    print("[!] Injecting FORGED event into queue...")
-    state_mgr.state['event_queue'].append(fake_event)
-    
-    # 2. Save the tampered state
-    print("[*] Saving tampered state (re-encrypting with DPAPI)...")
-    state_mgr.save()
-    print("[√] Done. The state.json is now poisoned.")
+    # 2. Append it straight to the encrypted event log
+    print("[!] Injecting FORGED event into queue (re-encrypting with DPAPI)...")
+    state_mgr.event_log.append(fake_event)
+    state_mgr.flush_events()
+    print("[√] Done. The event log is now poisoned.")
     
     print("\n--- NEXT STEPS ---")
     print("1. Restart the FIM Admin Service.")
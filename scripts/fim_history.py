@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Query the local event history kept by the 'sqlite' queue backend.
+Answers questions like "what changed under /etc since yesterday" with an
+index lookup in events.db instead of replaying the queue.
+
+    python scripts/fim_history.py --under /etc --since 1d
+    python scripts/fim_history.py --since 2026-03-14T00:00:00 --limit 50
+    python scripts/fim_history.py --state-file /path/to/state.json --under /srv/www
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.state import FIMState
+
+UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_time(value):
+    """ISO timestamp, or a relative age such as 30m, 6h, 1d, 2w"""
+    if value and value[-1] in UNITS and value[:-1].isdigit():
+        return datetime.now() - timedelta(**{UNITS[value[-1]]: int(value[:-1])})
+    return datetime.fromisoformat(value)
+
+
+def default_state_file():
+    if sys.platform == 'win32':
+        base_dir = os.environ.get('PROGRAMDATA', 'C:\\ProgramData')
+        return os.path.join(base_dir, 'FIMClient', 'state.json')
+    return os.path.join(os.path.expanduser('~/.fim-client'), 'state.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the FIM event history")
+    parser.add_argument('--under', default=None, help="only paths under this prefix")
+    parser.add_argument('--since', default=None, help="ISO timestamp or age (30m, 6h, 1d, 2w)")
+    parser.add_argument('--until', default=None, help="ISO timestamp or age")
+    parser.add_argument('--limit', type=int, default=None)
+    parser.add_argument('--state-file', default=default_state_file())
+    args = parser.parse_args()
+
+    store = FIMState.open_history(args.state_file)
+    if store is None:
+        print(f"No event history next to {args.state_file} (is queue_backend set to 'sqlite'?)")
+        return
+
+    try:
+        events = store.history(
+            path_prefix=args.under,
+            since=parse_time(args.since) if args.since else None,
+            until=parse_time(args.until) if args.until else None,
+            limit=args.limit
+        )
+    finally:
+        store.close()
+    for event in events:
+        status = f"acked {event['acked_at']}" if event.get('acked_at') else "pending"
+        moved = f" (from {event['old_path']})" if event.get('old_path') else ""
+        print(f"{event.get('timestamp') or event.get('queued_at')}  #{event.get('id')}  "
+              f"{event.get('event_type', '?'):9} {event.get('file_path')}{moved}  [{status}]")
+    print(f"{len(events)} events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Local HTTPS stand-in for the FIM server, for benchmarks and manual tests.
+Implements the client-facing endpoints (register, verify, heartbeat,
+events/report, events/acknowledge, and the batch endpoints
+events/report_batch and events/acknowledge_batch) with unsigned
+responses, keeps the received events in memory and serves HTTP/1.1
+keep-alive over TLS with a throwaway self-signed certificate for localhost.
+Once it knows the device public key (passed in, or sent on register) it
+authenticates reports like the server: the event hash and chain, per-event
+signatures, and batch signatures covering the MAC-only events before them.
+
+    python scripts/fim_standin_server.py --port 8443
+    python scripts/fim_standin_server.py --no-batch   (a server without batch support)
+    python scripts/fim_standin_server.py --latency 0.1   (simulate a 100 ms round trip)
+    (then point server_url at https://localhost:8443 and server_cert at the printed path)
+"""
+import os
+import ssl
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import ipaddress
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.crypto import verify_with_public_key
+from core.state import event_payload, compute_event_hash, batch_payload
+
+
+def make_self_signed_cert(directory):
+    """Write a localhost certificate and key into directory; returns (cert_path, key_path)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.utcnow()
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(minutes=5))
+            .not_valid_after(now + timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([
+                x509.DNSName('localhost'), x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]), critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256()))
+    cert_path = os.path.join(directory, 'server.crt')
+    key_path = os.path.join(directory, 'server.key')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class ChainVerifier:
+    """
+    Authenticates queued events with the device public key only (the
+    server never has the MAC key). Every event must carry its correct
+    chained event_hash. A device signature authenticates its event, and a
+    batch signature its chain head; either one also vouches for every
+    event it chains back to. Reports may arrive out of order or twice (a
+    send window, resends after a rewind), so MAC-only events wait until a
+    later authenticated event links back to them.
+    """
+
+    def __init__(self, public_key_pem):
+        self.public_key = serialization.load_pem_public_key(public_key_pem.encode('utf-8'))
+        self.prev = {}        # event_hash -> prev_event_hash
+        self.next = {}        # prev_event_hash -> event_hash
+        self.verified = set()
+
+    @property
+    def authenticated(self):
+        return len(self.verified)
+
+    @property
+    def unverified(self):
+        """Received events no signature covers yet"""
+        return len(self.prev) - len(self.verified)
+
+    def receive(self, event):
+        """Check one reported event; raises ValueError if it is forged"""
+        event_hash = event.get('event_hash')
+        if not event_hash or compute_event_hash(event) != event_hash:
+            raise ValueError(f"event hash mismatch at event {event.get('id')}")
+        if event.get('signature'):
+            if not verify_with_public_key(self.public_key, event_payload(event), event['signature']):
+                raise ValueError(f"bad signature at event {event.get('id')}")
+        elif event.get('batch_signature'):
+            if not verify_with_public_key(self.public_key, batch_payload(event), event['batch_signature']):
+                raise ValueError(f"bad batch signature at event {event.get('id')}")
+        elif not event.get('mac'):
+            raise ValueError(f"unsealed event {event.get('id')}")
+
+        self.prev[event_hash] = event.get('prev_event_hash')
+        if event.get('prev_event_hash'):
+            self.next[event['prev_event_hash']] = event_hash
+        if event.get('signature') or event.get('batch_signature') or self.next.get(event_hash) in self.verified:
+            self._vouch(event_hash)
+
+    def _vouch(self, event_hash):
+        while event_hash in self.prev and event_hash not in self.verified:
+            self.verified.add(event_hash)
+            event_hash = self.prev[event_hash]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        route = self.server.routes.get(self.path)
+        with self.server.stats_lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if route is None:
+            self._reply(404, {'error': f'no route {self.path}'})
+            return
+        status, payload = route(body)
+        self._reply(status, payload)
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInHTTPSServer:
+    """
+    Threaded HTTPS server on 127.0.0.1. routes maps a path to
+    handler(body) -> (status, payload); events holds every reported event
+    and acks the acknowledged event ids. connections counts accepted TCP
+    connections (one per TLS handshake), requests the POSTs served.
+    batch=False leaves out the batch endpoints (they answer 404).
+    latency (seconds) delays every response, standing in for the link RTT;
+    the first report of each event id in fail_once answers 503 (for a
+    batch, the whole request does).
+    public_key (PEM) enables the checks in verifier (a ChainVerifier);
+    forged reports answer 400.
+    """
+
+    def __init__(self, port=0, batch=True, latency=0.0, fail_once=(), public_key=None):
+        self.workdir = tempfile.mkdtemp(prefix='fim-standin-')
+        self.cert_path, key_path = make_self_signed_cert(self.workdir)
+        self.events = []
+        self.acks = []
+        self.connections = 0
+        self.fail_once = set(fail_once)
+        self.verifier = ChainVerifier(public_key) if public_key else None
+        self.lock = threading.Lock()
+
+        server = self
+        class CountingServer(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def get_request(self):
+                sock, addr = super().get_request()
+                with server.lock:
+                    server.connections += 1
+                return sock, addr
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_path, key_path)
+        self.httpd = CountingServer(('127.0.0.1', port), StandInHandler)
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        self.httpd.requests = 0
+        self.httpd.latency = latency
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.routes = {
+            '/api/clients/register': self._register,
+            '/api/clients/verify': lambda body: (200, {'status': 'verified'}),
+            '/api/clients/heartbeat': lambda body: (200, {'status': 'ok'}),
+            '/api/events/report': self._report,
+            '/api/events/acknowledge': self._acknowledge,
+        }
+        if batch:
+            self.httpd.routes['/api/events/report_batch'] = self._report_batch
+            self.httpd.routes['/api/events/acknowledge_batch'] = self._acknowledge_batch
+        self.thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def url(self):
+        return f"https://localhost:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _register(self, body):
+        if body.get('public_key'):
+            with self.lock:
+                self.verifier = ChainVerifier(body['public_key'])
+        return 200, {'status': 'registered'}
+
+    def _report(self, event):
+        with self.lock:
+            if event.get('id') in self.fail_once:
+                self.fail_once.discard(event.get('id'))
+                return 503, {'error': 'temporarily unavailable'}
+            if self.verifier:
+                try:
+                    self.verifier.receive(event)
+                except ValueError as e:
+                    return 400, {'error': str(e), 'rejected': True}
+            self.events.append(event)
+        return 200, {
+            'event_id': event.get('id'),
+            'validation': {'status': 'valid', 'validated_at': datetime.now().isoformat()},
+            'accepted': True,
+            'recorded': True
+        }
+
+    def _acknowledge(self, body):
+        with self.lock:
+            self.acks.append(body.get('event_id'))
+        return 200, {'status': 'acknowledged'}
+
+    def _report_batch(self, body):
+        events = body.get('events', [])
+        with self.lock:
+            failing = self.fail_once.intersection(event.get('id') for event in events)
+            if failing:
+                self.fail_once -= failing
+                return 503, {'error': 'temporarily unavailable'}
+        return 200, {'results': [self._report(event)[1] for event in body.get('events', [])]}
+
+    def _acknowledge_batch(self, body):
+        with self.lock:
+            self.acks.extend(ack.get('event_id') for ack in body.get('acks', []))
+        return 200, {'status': 'acknowledged', 'count': len(body.get('acks', []))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTPS stand-in FIM server")
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--no-batch', action='store_true', help="answer 404 on the batch endpoints")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    server = StandInHTTPSServer(args.port, batch=not args.no_batch, latency=args.latency).start()
+    print(f"Serving on {server.url} (certificate: {server.cert_path}); Ctrl+C to stop")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{len(server.events)} events, {len(server.acks)} acks, "
+              f"{server.requests} requests, {server.connections} connections")
+        if server.verifier:
+            print(f"{server.verifier.authenticated} authenticated, {server.verifier.unverified} not covered by a signature")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
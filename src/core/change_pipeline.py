@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Change pipeline decoupling file event dispatch from hashing and commits.
+
+    submit_batch() --bounded queue--> hash workers --> committer --> FileMonitor
+
+Callers only enqueue paths. A pool of workers hashes files outside the
+monitor lock, and a single committer thread applies results to the Merkle
+tree in order. When the queue stays full, new events are dropped and a
+rescan of the watch directory reconciles the tree instead.
+
+A directory move re-keys a whole subtree, so it is a barrier in submission
+order: it commits only after every earlier change has, and later changes
+wait for it, whatever order the workers finish in.
+"""
+import time
+import heapq
+import queue
+import threading
+import logging
+
+from core.tree_builder import iter_files
+
+_STOP = object()
+
+# Work item kinds
+CHANGE = 'change'        # (path,): hash and commit a create/modify/delete
+MOVE = 'move'            # (src, dest): re-key a file, rehashing only if its identity changed
+DIR_MOVE = 'dir_move'    # (src, dest): re-key a whole subtree
+CHECK = 'check'          # (path,): rehash only if the identity tag no longer matches
+
+
+class ChangePipeline:
+    """Bounded hash-worker pool with a single committer for a FileMonitor"""
+
+    def __init__(self, file_monitor, watch_dir, workers=4, max_queue=10000,
+                 overflow_timeout=1.0, logger=None):
+        self.monitor = file_monitor
+        self.watch_dir = watch_dir
+        self.workers = workers
+        self.overflow_timeout = overflow_timeout
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.changes = queue.Queue(maxsize=max_queue)
+        self.results = queue.Queue()
+        self.threads = []
+
+        # Latest submitted sequence number per path; a result is only
+        # committed if no newer change for the same path was submitted since
+        self.seq_lock = threading.Lock()
+        self.seq = 0
+        self.latest = {}
+        self.outstanding = set()   # submitted seqs not yet committed or skipped
+        self.dir_moves = []        # heap of outstanding DIR_MOVE seqs
+
+        self.rescan_lock = threading.Lock()
+        self.overflowed = threading.Event()
+        self.rescan_thread = None
+        self.overflows = 0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._hash_worker, name=f'FIMHash-{i}', daemon=True)
+            t.start()
+            self.threads.append(t)
+        self.committer = threading.Thread(target=self._commit_loop, name='FIMCommit', daemon=True)
+        self.committer.start()
+        return self
+
+    def stop(self):
+        """Drain queued changes, then stop workers and the committer"""
+        for _ in self.threads:
+            self.changes.put(_STOP)
+        for t in self.threads:
+            t.join()
+        self.results.put(_STOP)
+        self.committer.join()
+
+    def detect_file_change(self, file_path, is_new=False, is_deleted=False):
+        """Enqueue a single change (same signature as FIMEventHandler's)"""
+        self.submit_batch([(file_path, is_new, is_deleted)])
+
+    def detect_file_move(self, src_path, dest_path, is_directory=False):
+        """Enqueue a rename of a file or a whole directory"""
+        self._submit(DIR_MOVE if is_directory else MOVE, (src_path, dest_path))
+
+    def submit_batch(self, batch, block=False):
+        """
+        Enqueue (path, is_new, is_deleted) changes.
+        Blocks up to overflow_timeout per change when the queue is full; past
+        that the change is dropped and a rescan is scheduled. With block=True
+        (used by the rescan itself) it waits indefinitely instead.
+        """
+        for file_path, is_new, is_deleted in batch:
+            self._submit(CHANGE, (file_path,), is_deleted, block)
+
+    def _submit(self, kind, paths, arg=None, block=False):
+        if self.overflowed.is_set() and not block:
+            return  # the pending rescan will pick these paths up
+        with self.seq_lock:
+            if kind == CHECK and paths[0] in self.latest:
+                return  # a change in flight will rehash it anyway
+            self.seq += 1
+            seq = self.seq
+            self.outstanding.add(seq)
+            if kind == DIR_MOVE:
+                heapq.heappush(self.dir_moves, seq)
+            else:
+                for path in paths:
+                    self.latest[path] = seq
+        try:
+            self.changes.put((seq, kind, paths, arg),
+                             timeout=None if block else self.overflow_timeout)
+        except queue.Full:
+            with self.seq_lock:
+                self._settle(seq)
+                for path in paths:
+                    if self.latest.get(path) == seq:
+                        del self.latest[path]
+            self._overflow()
+
+    def _settle(self, seq):
+        """Mark seq as committed or dropped (caller holds seq_lock)"""
+        self.outstanding.discard(seq)
+        if seq in self.dir_moves:
+            self.dir_moves.remove(seq)
+            heapq.heapify(self.dir_moves)
+
+    def _ready(self, seq):
+        """Whether the result for seq may commit now (caller holds seq_lock)"""
+        if self.dir_moves and self.dir_moves[0] == seq:
+            return min(self.outstanding) == seq  # every earlier change is in
+        return not self.dir_moves or self.dir_moves[0] > seq
+
+    def _overflow(self):
+        if self.overflowed.is_set():
+            return
+        self.overflowed.set()
+        self.overflows += 1
+        self.logger.warning(f"Change queue full ({self.changes.maxsize}); dropping events and rescanning {self.watch_dir}")
+        self.monitor.log_to_gui("Change queue overflowed - rescanning watch directory", "warning")
+        with self.rescan_lock:
+            if self.rescan_thread is None:
+                self.rescan_thread = threading.Thread(target=self._rescan, name='FIMRescan', daemon=True)
+                self.rescan_thread.start()
+
+    def _rescan(self):
+        """Reconcile the tree with the watch directory after dropped events"""
+        while True:
+            with self.rescan_lock:
+                if not self.overflowed.is_set():
+                    self.rescan_thread = None
+                    return
+
+            # Wait for room before accepting events again, then walk: any
+            # change after this point is either queued normally or seen below
+            while self.changes.qsize() > self.changes.maxsize // 2:
+                time.sleep(0.1)
+            self.overflowed.clear()
+
+            with self.monitor.lock:
+                tracked = set(path for path, _ in self.monitor.tree)
+            batch = []
+            for path in iter_files(self.watch_dir):
+                tracked.discard(path)
+                batch.append((path, False, False))
+                if len(batch) >= 1000:
+                    self.submit_batch(batch, block=True)
+                    batch = []
+            batch.extend((path, False, True) for path in tracked)
+            self.submit_batch(batch, block=True)
+            self.logger.info(f"Rescan of {self.watch_dir} queued")
+
+    def _verify_moved(self, moved):
+        """Queue identity checks for re-keyed files; only changed ones get rehashed"""
+        for _, new_path, _ in moved:
+            self._submit(CHECK, (new_path,), block=True)
+
+    def _hash_worker(self):
+        while True:
+            item = self.changes.get()
+            if item is _STOP:
+                return
+            seq, kind, paths, arg = item
+            try:
+                if kind == CHANGE:
+                    result = self.monitor.hash_change(paths[0], arg)
+                elif kind == MOVE:
+                    result = self.monitor.hash_move(*paths)
+                elif kind == CHECK:
+                    if self.monitor.needs_rehash(paths[0]):
+                        kind, result = CHANGE, self.monitor.hash_change(paths[0], False)
+                    else:
+                        result = None
+                else:
+                    result = None
+            except Exception as e:
+                self.logger.error(f"Hashing {paths[-1]} failed: {e}")
+                kind, result = CHECK, None
+            self.results.put((seq, kind, paths, result))
+
+    def _commit(self, kind, paths, result):
+        """Apply one worker result under the monitor lock; returns True if an event was queued"""
+        with self.monitor.lock:
+            if kind == CHANGE:
+                h, tag, is_deleted = result
+                if h is None and not is_deleted:
+                    return False
+                return self.monitor.commit_change(paths[0], h, is_deleted, tag)
+            if kind == DIR_MOVE:
+                moved = self.monitor.commit_directory_move(*paths)
+                if moved:
+                    threading.Thread(target=self._verify_moved, args=(moved,), daemon=True).start()
+                return bool(moved)
+            if kind != MOVE:
+                return False
+            h, tag = result
+            queued = self.monitor.commit_move(paths[0], paths[1], h, tag)
+            if queued is not None:
+                return queued
+
+        # MOVE of a file we were not tracking (e.g. renamed while its create
+        # was still being hashed): hash it like any new file
+        self.submit_batch([(paths[1], True, False)])
+        return False
+
+    def _commit_loop(self):
+        queued = 0
+        held = []  # results waiting on a directory move, heap by seq
+        while True:
+            item = self.results.get()
+            if item is _STOP:
+                break
+            heapq.heappush(held, item)
+
+            while held:
+                with self.seq_lock:
+                    if not self._ready(held[0][0]):
+                        break
+                    seq, kind, paths, result = heapq.heappop(held)
+                    self._settle(seq)
+                    # Skip results superseded by a newer change still in flight
+                    current = [self.latest.get(path) == seq for path in paths]
+                    for path, is_current in zip(paths, current):
+                        if is_current:
+                            del self.latest[path]
+
+                if kind == MOVE and not all(current):
+                    # Part of the rename was overtaken: re-examine both paths
+                    self.submit_batch([(path, False, False) for path in paths])
+                elif (kind == DIR_MOVE or all(current)) and not self.monitor.deregistered:
+                    try:
+                        if self._commit(kind, paths, result):
+                            queued += 1
+                    except Exception as e:
+                        self.logger.error(f"Committing {kind} of {paths[-1]} failed: {e}")
+
+            if queued and self.results.empty():
+                self.monitor.notify_queued()
+                queued = 0
+
+        if queued:
+            self.monitor.notify_queued()
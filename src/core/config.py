@@ -19,6 +19,24 @@ class FIMConfig:
         self.watch_dir = watch_dir
         self.pid_file = pid_file
         self.server_cert = None # Path to server certificate for pinning
+        self.http_pool_size = 4 # Kept-alive connections to the server shared by events, acks and heartbeats (raised to queue_send_window)
+        self.scan_workers = None # Hash threads for the initial scan (None = auto)
+        self.event_quiet_window = 0.5 # Seconds a path must be quiet before its events are processed
+        self.hash_workers = 4 # Threads hashing changed files outside the monitor lock
+        self.change_queue_size = 10000 # Pending changes before overflow triggers a rescan
+        self.queue_commit_window = 0.005 # Seconds queued events may wait for a shared fsync
+        self.queue_commit_batch = 256 # Queued events that force a group fsync regardless of the window
+        self.queue_memory_window = 1024 # Queued events kept in memory; the rest are paged in from disk
+        self.queue_backend = 'log' # 'log' (append-only segments) or 'sqlite' (also keeps acknowledged history)
+        self.queue_verify_workers = None # Spawned processes for a full queue signature check at startup (None = in-process)
+        self.queue_compaction_threshold = None # Queue size at which same-path events are compacted before sending (None = off)
+        self.queue_upload_batch = 1 # Queued events per report request (> 1 needs the server's batch endpoints; falls back otherwise)
+        self.queue_send_window = 1 # Events reported concurrently while draining the queue (acks still applied in queue order)
+        self.queue_integrity = 'signature' # 'signature' (device signature per event) or 'batch' (per-event MAC, one signature per batch)
+        self.queue_batch_sign_events = 256 # 'batch' integrity: events per signed batch
+        self.queue_batch_sign_seconds = 5.0 # 'batch' integrity: a batch open this long is closed by the next event
+        self.state_tamper_watch = False # Also watch state.json for changes instead of only checking it every loop (~10 s)
+        self.device_key_type = 'rsa' # Algorithm for newly generated device keys: 'rsa' (RSA-2048 PSS) or 'ed25519'
         self.logger = logging.getLogger(__name__) # Default logger if setup_logging not called
         
     def setup_logging(self, log_file):
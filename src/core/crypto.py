@@ -4,23 +4,59 @@ Cryptographic functions for FIM Device Signing
 """
 import os
 import json
-from cryptography.hazmat.primitives.asymmetric import rsa
+import hmac
+import hashlib
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.exceptions import InvalidSignature
 
+KEY_TYPES = ('rsa', 'ed25519')
+
+
+def verify_with_public_key(public_key, payload_string, signature_hex):
+    """Check a hex device signature (RSA-PSS or Ed25519, by key type) over payload_string"""
+    try:
+        signature = bytes.fromhex(signature_hex)
+        data = payload_string.encode('utf-8')
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, data)
+        else:
+            public_key.verify(
+                signature,
+                data,
+                padding.PSS(
+                    mgf=padding.MGF1(hashes.SHA256()),
+                    salt_length=32
+                ),
+                hashes.SHA256()
+            )
+        return True
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+
+
 class DeviceSigner:
     """Manages device keys and signatures"""
     
-    def __init__(self, key_dir):
+    def __init__(self, key_dir, key_type='rsa'):
+        """
+        key_type ('rsa' or 'ed25519') only applies when a new key pair is
+        generated; existing keys keep their type, since the server has their
+        public key on record. self.key_type reports the type in use.
+        """
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"Unsupported device key type: {key_type}")
         self.key_dir = key_dir
         self.private_key_path = os.path.join(key_dir, 'device_private.pem')
         self.public_key_path = os.path.join(key_dir, 'device_public.pem')
         self.private_key = None
         self.public_key = None
+        self.key_type = key_type
         
         self.load_or_generate_keys()
+        self.key_type = 'ed25519' if isinstance(self.private_key, ed25519.Ed25519PrivateKey) else 'rsa'
         
     def load_or_generate_keys(self):
         """Load existing keys or generate new ones"""
@@ -38,11 +74,14 @@ class DeviceSigner:
             self.generate_keys()
 
     def generate_keys(self):
-        """Generate a new RSA key pair and save to restricted PEM files"""
-        self.private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
-        )
+        """Generate a new key pair of self.key_type and save to restricted PEM files"""
+        if self.key_type == 'ed25519':
+            self.private_key = ed25519.Ed25519PrivateKey.generate()
+        else:
+            self.private_key = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=2048,
+            )
         self.public_key = self.private_key.public_key()
         
         os.makedirs(self.key_dir, exist_ok=True)
@@ -76,6 +115,8 @@ class DeviceSigner:
         if not self.private_key:
             return None
             
+        if self.key_type == 'ed25519':
+            return self.private_key.sign(payload_string.encode('utf-8')).hex()
         signature = self.private_key.sign(
             payload_string.encode('utf-8'),
             padding.PSS(
@@ -86,6 +127,32 @@ class DeviceSigner:
         )
         return signature.hex()
 
+    def verify_payload(self, payload_string, signature_hex):
+        """Check a hex signature made by sign_payload against this device's public key"""
+        return verify_with_public_key(self.public_key, payload_string, signature_hex)
+
+    def derive_key(self, purpose):
+        """Derive a 32-byte local secret for purpose (bytes) from the device private key"""
+        private_der = self.private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        return hmac.new(private_der, purpose, hashlib.sha256).digest()
+
+def verify_device_signatures(public_key_pem, items):
+    """
+    Verify (payload_string, signature_hex) pairs against a device public key.
+    Module-level so it can run in a process pool; returns the index of the
+    first bad signature, or -1 if all are valid.
+    """
+    public_key = serialization.load_pem_public_key(public_key_pem.encode('utf-8'))
+    for i, (payload_string, signature_hex) in enumerate(items):
+        if not verify_with_public_key(public_key, payload_string, signature_hex):
+            return i
+    return -1
+
+
 class ServerVerifier:
     """Verifies signatures from the FIM Server"""
     
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Event coalescing stage between the watchdog thread and the FileMonitor.
+Raw create/modify/delete notifications are gathered per path until the path
+has been quiet for a configurable window, then handed over as one batch.
+"""
+import os
+import time
+import threading
+import logging
+
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+# (pending kind, new kind) -> coalesced kind; None means the changes cancel out
+_MERGE = {
+    (CREATED, CREATED): CREATED,
+    (CREATED, MODIFIED): CREATED,
+    (CREATED, DELETED): None,
+    (MODIFIED, CREATED): MODIFIED,
+    (MODIFIED, MODIFIED): MODIFIED,
+    (MODIFIED, DELETED): DELETED,
+    (DELETED, CREATED): MODIFIED,
+    (DELETED, MODIFIED): MODIFIED,
+    (DELETED, DELETED): DELETED,
+}
+
+
+class EventCoalescer:
+    """
+    Debounces file events per path and delivers them in batches.
+
+    detect_file_change() and detect_file_move() have the same signatures as
+    FIMEventHandler's, so the watchdog handler can feed either. sink(batch)
+    receives a list of (path, is_new, is_deleted) tuples in first-seen order
+    on the coalescer's own thread. A path that keeps changing is still
+    flushed once it has been pending for max_delay seconds.
+
+    Renames are not delayed: pending events under the old path are carried
+    over to the new one and the rename goes straight to move_sink(src, dest,
+    is_directory) so the moved leaves are re-keyed before later changes.
+    """
+
+    def __init__(self, sink, quiet_window=0.5, max_delay=None, logger=None, move_sink=None):
+        self.sink = sink
+        self.move_sink = move_sink
+        self.quiet_window = quiet_window
+        self.max_delay = max_delay if max_delay is not None else quiet_window * 10
+        self.logger = logger or logging.getLogger(__name__)
+        self.pending = {}  # path -> [kind, first_seen, last_seen]
+        self.cond = threading.Condition()
+        self.stopping = False
+        self.thread = None
+        self.received = 0
+        self.delivered = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='FIMCoalescer', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Flush everything still pending and stop the delivery thread"""
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        if self.thread:
+            self.thread.join()
+
+    def detect_file_change(self, file_path, is_new=False, is_deleted=False):
+        """Record a raw event for file_path"""
+        kind = DELETED if is_deleted else (CREATED if is_new else MODIFIED)
+        now = time.monotonic()
+        with self.cond:
+            self.received += 1
+            entry = self.pending.get(file_path)
+            if entry is None:
+                self.pending[file_path] = [kind, now, now]
+                if len(self.pending) == 1:
+                    self.cond.notify()
+                return
+            merged = _MERGE[(entry[0], kind)]
+            if merged is None:
+                del self.pending[file_path]
+            else:
+                entry[0] = merged
+                entry[2] = now
+
+    def detect_file_move(self, src_path, dest_path, is_directory=False):
+        """Record a rename; without a move_sink it degrades to delete + create"""
+        if self.move_sink is None:
+            if not is_directory:
+                self.detect_file_change(src_path, is_deleted=True)
+                self.detect_file_change(dest_path, is_new=True)
+            return
+
+        with self.cond:
+            if is_directory:
+                src_prefix = src_path.rstrip('/\\') + os.sep
+                moving = [path for path in self.pending if path.startswith(src_prefix)]
+                renamed = [(path, os.path.join(dest_path, path[len(src_prefix):])) for path in moving]
+            else:
+                renamed = [(src_path, dest_path)] if src_path in self.pending else []
+            for old_path, new_path in renamed:
+                kind, first_seen, last_seen = self.pending.pop(old_path)
+                entry = self.pending.get(new_path)
+                if entry is None:
+                    self.pending[new_path] = [kind, first_seen, last_seen]
+                else:
+                    merged = _MERGE[(entry[0], kind)]
+                    if merged is None:
+                        del self.pending[new_path]
+                    else:
+                        entry[0] = merged
+                        entry[2] = last_seen
+
+        try:
+            self.move_sink(src_path, dest_path, is_directory)
+        except Exception as e:
+            self.logger.error(f"Failed to process move of {src_path}: {e}")
+
+    def _take_due(self, now):
+        """Pop paths that are quiet (or overdue); returns (batch, seconds until the next is due)"""
+        batch = []
+        next_due = None
+        for path, (kind, first_seen, last_seen) in self.pending.items():
+            due_at = min(last_seen + self.quiet_window, first_seen + self.max_delay)
+            if self.stopping or due_at <= now:
+                batch.append((path, kind == CREATED, kind == DELETED))
+            elif next_due is None or due_at < next_due:
+                next_due = due_at
+        for path, _, _ in batch:
+            del self.pending[path]
+        return batch, (next_due - now if next_due is not None else None)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopping:
+                    self.cond.wait()
+                if self.stopping and not self.pending:
+                    return
+                batch, wait = self._take_due(time.monotonic())
+                if not batch:
+                    self.cond.wait(wait)
+                    continue
+                self.delivered += len(batch)
+
+            try:
+                self.sink(batch)
+            except Exception as e:
+                self.logger.error(f"Failed to process {len(batch)} coalesced events: {e}")
@@ -15,7 +15,10 @@ class FIMEventHandler:
         self.lock = threading.Lock()
         
         self.network_client = NetworkClient(config, connection_mgr, log_callback, state)
-        self.event_queue_mgr = EventQueueManager(state, self.network_client, connection_mgr, log_callback)
+        self.event_queue_mgr = EventQueueManager(state, self.network_client, connection_mgr, log_callback,
+                                                 compact_threshold=config.queue_compaction_threshold,
+                                                 batch_size=config.queue_upload_batch,
+                                                 send_window=config.queue_send_window)
         self.file_monitor = FileMonitor(tree, files, config, state, log_callback, self.event_queue_mgr, self.lock)
 
     @property
@@ -55,6 +58,10 @@ class FIMEventHandler:
         """Trigger the file monitor to process a specific path change"""
         self.file_monitor.detect_change(file_path, is_new, is_deleted)
 
+    def detect_file_move(self, src_path, dest_path, is_directory=False):
+        """Trigger the file monitor to re-key a renamed file or directory"""
+        self.file_monitor.detect_move(src_path, dest_path, is_directory)
+
     def send_heartbeat(self):
         """Retrieve current state and dispatch a server heartbeat"""
         try:
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Segmented append-only log for the pending event queue.
+
+Each event is one encrypted record appended to the active segment, so
+enqueue and dequeue cost O(1) on disk instead of rewriting state.json:
+
+    <dir>/00000001.seg   [u32 length][u32 crc32][encrypted JSON] ...
+    <dir>/head.json      {"segment": n, "offset": bytes, "last_event_id": id}
+
+Dequeues only advance the head checkpoint; segments that lie entirely
+before the head are deleted, and the active segment rolls over once it
+exceeds segment_size.
+
+Appends are group-committed: records are buffered and made durable with a
+single write + fsync, either on sync() or once commit_window seconds have
+passed / commit_batch records are pending. Concurrent sync() callers share
+one fsync. Only durable events are visible to peek() and pop().
+
+Memory is bounded: only the oldest and newest events (a head and a tail
+window) are kept decoded. Everything in between is left on disk and paged
+back into the head window as the queue drains.
+
+Only a torn final record (its length runs past the end of the last
+segment, as after a crash mid-write) is cut off on load. A complete record
+that fails its CRC or decryption is skipped and recorded in `corrupt`;
+FIMState treats that as a tampered queue rather than silently dropping the
+events behind it.
+"""
+import os
+import sys
+import json
+import zlib
+import shutil
+import struct
+import logging
+import threading
+from collections import deque
+
+RECORD_HEADER = struct.Struct('<II')
+HEAD_FILE = 'head.json'
+SEGMENT_SUFFIX = '.seg'
+DEFAULT_SEGMENT_SIZE = 4 * 1024 * 1024
+
+
+class EventLog:
+    """
+    Append-only, segmented event queue with a head-offset checkpoint.
+
+    encrypt/decrypt are bytes -> bytes callables applied per record (the
+    state file's Fernet/DPAPI helpers). append runs on FIMState's signing
+    thread without FIMState's lock, while peek/pop run under it, so
+    io_lock guards everything they share: the memory window (head, tail,
+    spilled, spill_cursor, spill_ticket), the buffered records and the
+    active segment. sync() waits on sync_cond outside io_lock so waiters
+    can batch up. At most memory_window events are held in memory, split
+    between the head and tail windows.
+    """
+
+    def __init__(self, directory, encrypt, decrypt, logger=None, segment_size=DEFAULT_SEGMENT_SIZE,
+                 commit_window=0.005, commit_batch=256, memory_window=1024):
+        self.directory = directory
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.logger = logger or logging.getLogger(__name__)
+        self.segment_size = segment_size
+        self.commit_window = commit_window
+        self.commit_batch = commit_batch
+        self.last_event_id = 0
+        self.head_segment = 1
+        self.head_offset = 0
+        self.active_segment = 1
+        self.active_file = None
+        self.active_size = 0
+
+        # Queue order is head + spilled + tail. Entries are
+        # (event, segment, start offset, end offset, ticket); spilled events
+        # exist only on disk, starting at spill_cursor (segment, offset)
+        self.head_window = max(1, memory_window // 2)
+        self.tail_window = max(1, memory_window - self.head_window)
+        self.head = deque()
+        self.tail = deque()
+        self.spilled = 0
+        self.spill_cursor = None
+        self.spill_ticket = 0
+        self.damaged = None
+        self.corrupt = []   # (segment, offset) of complete records that failed CRC/decryption
+
+        # Group commit: records are numbered by ticket; everything up to
+        # self.synced is on disk, self.pending holds bytes not yet written
+        self.io_lock = threading.Lock()
+        self.sync_cond = threading.Condition()
+        self.pending = bytearray()
+        self.written = 0
+        self.synced = 0
+        self.syncing = False
+        self.timer = None
+        self.syncs = 0
+
+        self._recover_rewrite()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self):
+        return len(self.head) + self.spilled + len(self.tail)
+
+    def __iter__(self):
+        """All pending events, oldest first; spilled ones are streamed from disk"""
+        with self.io_lock:
+            head, tail = list(self.head), list(self.tail)
+            spilled, cursor = self.spilled, self.spill_cursor
+            if spilled:
+                self._write_pending()
+        for entry in head:
+            yield entry[0]
+        if spilled:
+            for entry in self._read_from(cursor, spilled):
+                yield entry[0]
+        for entry in tail:
+            yield entry[0]
+
+    def peek(self):
+        with self.io_lock:
+            entry = self._front()
+        if entry and entry[4] <= self.synced:
+            return entry[0]
+        return None
+
+    def last(self):
+        with self.io_lock:
+            if self.tail:
+                return self.tail[-1][0]
+            return self.head[-1][0] if self.head else None
+
+    def append(self, event):
+        """
+        Buffer one event and return its ticket; sync(ticket) makes it durable.
+        Without an explicit sync it is committed once commit_window seconds
+        pass (if set) or commit_batch records are pending.
+        """
+        data = self.encrypt(json.dumps(event, separators=(',', ':')).encode('utf-8'))
+        record = RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+        with self.io_lock:
+            if self.active_size + len(record) > self.segment_size and self.active_size > 0:
+                self._roll()
+            start = self.active_size
+            self.pending += record
+            self.active_size += len(record)
+            self.written += 1
+            ticket = self.written
+            self._push((event, self.active_segment, start, self.active_size, ticket))
+            backlog = self.written - self.synced
+
+        if isinstance(event.get('id'), int):
+            self.last_event_id = max(self.last_event_id, event['id'])
+
+        if backlog >= self.commit_batch:
+            self.sync(ticket)
+        elif self.commit_window:
+            self._schedule_sync()
+        return ticket
+
+    def sync(self, ticket=None):
+        """Block until the record with this ticket (default: all) is durable"""
+        with self.io_lock:
+            if ticket is None:
+                ticket = self.written
+        with self.sync_cond:
+            while self.synced < ticket and self.syncing:
+                self.sync_cond.wait()
+            if self.synced >= ticket:
+                return
+            self.syncing = True
+
+        # Leader: one write + fsync for everything appended so far
+        target = self.synced
+        try:
+            with self.io_lock:
+                target = self.written
+                f = self.active_file
+                f.write(self.pending)
+                self.pending.clear()
+                f.flush()
+                fd = os.dup(f.fileno())
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.syncs += 1
+        finally:
+            with self.sync_cond:
+                self.synced = max(self.synced, target)
+                self.syncing = False
+                self.sync_cond.notify_all()
+
+    def peek_many(self, count):
+        """Up to count of the oldest durable events, without removing them"""
+        events = []
+        with self.io_lock:
+            self._front()
+            queues = (self.head,) if self.spilled else (self.head, self.tail)
+            for queue in queues:
+                for entry in queue:
+                    if len(events) >= count or entry[4] > self.synced:
+                        return events
+                    events.append(entry[0])
+        return events
+
+    def pop(self):
+        """Remove the oldest durable event and checkpoint the new head"""
+        events = self.pop_many(1)
+        return events[0] if events else None
+
+    def pop_many(self, count):
+        """Remove up to count of the oldest durable events with one head checkpoint"""
+        events = []
+        with self.io_lock:
+            previous_segment = self.head_segment
+            while len(events) < count:
+                entry = self._front()
+                if entry is None or entry[4] > self.synced:
+                    break
+                queue = self.head if self.head else self.tail
+                event, segment, _, offset, _ = queue.popleft()
+                self.head_segment, self.head_offset = segment, offset
+                events.append(event)
+            if not events:
+                return events
+            self._write_head()
+        for stale in range(previous_segment, self.head_segment):
+            self._remove_segment(stale)
+        return events
+
+    def close(self):
+        self.sync()
+        with self.io_lock:
+            self._close()
+
+    def rewrite(self, events):
+        """
+        Replace the pending queue with events (an iterable that may stream
+        from this log). The new queue is written and synced in a side
+        directory, then swapped in by rename.
+        """
+        self.sync()
+        new_dir = self.directory + '.rewrite'
+        shutil.rmtree(new_dir, ignore_errors=True)
+        new_log = EventLog(new_dir, self.encrypt, self.decrypt, logger=self.logger,
+                           segment_size=self.segment_size, commit_window=0, commit_batch=self.commit_batch,
+                           memory_window=self.head_window + self.tail_window)
+        for event in events:
+            new_log.append(event)
+        new_log.last_event_id = max(new_log.last_event_id, self.last_event_id)
+        new_log.sync()
+        new_log._write_head()
+        new_log.close()
+
+        with self.io_lock:
+            self._close()
+            old_dir = self.directory + '.old'
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(self.directory, old_dir)
+            os.replace(new_dir, self.directory)
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+            self.head.clear()
+            self.tail.clear()
+            self.spilled = 0
+            self.spill_cursor = None
+            self.head_segment, self.head_offset = 1, 0
+            self._load()
+
+    def _close(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.active_file:
+            self.active_file.close()
+            self.active_file = None
+
+    def _recover_rewrite(self):
+        """Finish or discard a rewrite() interrupted between its renames"""
+        new_dir, old_dir = self.directory + '.rewrite', self.directory + '.old'
+        if not os.path.isdir(self.directory):
+            for candidate in (new_dir, old_dir):
+                if os.path.isdir(candidate):
+                    os.replace(candidate, self.directory)
+                    break
+        shutil.rmtree(new_dir, ignore_errors=True)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    # Memory window
+    def _push(self, entry):
+        """Add the newest entry, spilling the oldest tail entry past the window"""
+        self.tail.append(entry)
+        if len(self.tail) <= self.tail_window:
+            return
+        entry = self.tail.popleft()
+        if not self.spilled and len(self.head) < self.head_window:
+            self.head.append(entry)
+            return
+        if not self.spilled:
+            self.spill_cursor = (entry[1], entry[2])
+            self.spill_ticket = entry[4]
+        self.spilled += 1
+
+    def _front(self):
+        """Oldest entry, paging spilled events back into the head window first (caller holds io_lock)"""
+        if not self.head and self.spilled:
+            self._write_pending()
+            count = min(self.spilled, self.head_window)
+            ticket = self.spill_ticket
+            for event, segment, start, end in self._read_from(self.spill_cursor, count):
+                self.head.append((event, segment, start, end, ticket))
+                ticket += 1
+            paged = ticket - self.spill_ticket
+            if paged < count:
+                self.logger.error(f"Event log lost {count - paged} spilled events while paging them in")
+            self.spilled -= count
+            self.spill_ticket += count
+            if self.spilled and self.head:
+                self.spill_cursor = (self.head[-1][1], self.head[-1][3])
+        if self.head:
+            return self.head[0]
+        return self.tail[0] if self.tail else None
+
+    def _read_from(self, cursor, count):
+        """Decode up to count records from cursor onwards, crossing segment boundaries"""
+        segment, offset = cursor
+        while count > 0 and segment <= self.active_segment:
+            for event, start, end in self._records(segment, offset):
+                yield event, segment, start, end
+                count -= 1
+                if count == 0:
+                    return
+            segment, offset = segment + 1, 0
+
+    # Storage helpers (callers hold io_lock once the log is shared)
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit():
+                found.append(int(name[:-len(SEGMENT_SUFFIX)]))
+        return sorted(found)
+
+    def _records(self, segment, offset):
+        """
+        Yield (event, start, end) for each record of a segment from offset.
+        Complete records that fail CRC or decryption are skipped and added
+        to self.corrupt; a record cut short by the end of the file stops
+        the scan and is remembered in self.damaged.
+        """
+        try:
+            f = open(self._segment_path(segment), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            pos = offset
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    return
+                payload = b''
+                if len(header) == RECORD_HEADER.size:
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+                if len(header) < RECORD_HEADER.size or len(payload) < length:
+                    self.logger.error(f"Event log segment {segment} ends in a partial record at offset {pos}")
+                    self.damaged = (segment, pos)
+                    return
+                event = None
+                if zlib.crc32(payload) == crc:
+                    try:
+                        event = json.loads(self.decrypt(payload))
+                    except (ValueError, TypeError):
+                        event = None
+                end = pos + RECORD_HEADER.size + length
+                if event is None:
+                    self.logger.error(f"Event log segment {segment} has a corrupt record at offset {pos}")
+                    if (segment, pos) not in self.corrupt:
+                        self.corrupt.append((segment, pos))
+                else:
+                    yield event, pos, end
+                pos = end
+
+    def _write_pending(self):
+        """Hand buffered records to the OS so they can be read back (not an fsync)"""
+        if self.pending and self.active_file:
+            self.active_file.write(self.pending)
+            self.pending.clear()
+            self.active_file.flush()
+
+    def _open_active(self):
+        path = self._segment_path(self.active_segment)
+        self.active_file = open(path, 'ab')
+        self.active_size = self.active_file.tell()
+        if sys.platform != 'win32':
+            os.chmod(path, 0o600)
+
+    def _roll(self):
+        """Seal the active segment (durably) and open the next one"""
+        f = self.active_file
+        f.write(self.pending)
+        self.pending.clear()
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        self.active_segment += 1
+        self._open_active()
+
+    def _schedule_sync(self):
+        with self.io_lock:
+            if self.timer is None:
+                self.timer = threading.Timer(self.commit_window, self._timed_sync)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _timed_sync(self):
+        with self.io_lock:
+            self.timer = None
+        try:
+            self.sync()
+        except OSError as e:
+            self.logger.error(f"Event log group commit failed: {e}")
+
+    def _remove_segment(self, segment):
+        try:
+            os.remove(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"Could not remove event log segment {segment}: {e}")
+
+    def _write_head(self):
+        head = {
+            'segment': self.head_segment,
+            'offset': self.head_offset,
+            'last_event_id': self.last_event_id
+        }
+        path = os.path.join(self.directory, HEAD_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(head, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._sync_directory()
+
+    def _sync_directory(self):
+        """Make a rename in the log directory durable (not possible on Windows)"""
+        if sys.platform == 'win32':
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.directory, HEAD_FILE), 'r') as f:
+                head = json.load(f)
+            self.head_segment = int(head['segment'])
+            self.head_offset = int(head['offset'])
+            self.last_event_id = int(head.get('last_event_id', 0))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f"Event log head checkpoint unreadable, replaying all segments: {e}")
+            self.head_segment, self.head_offset = 0, 0
+
+        segments = self._segments()
+        for segment in segments:
+            if segment < self.head_segment:
+                self._remove_segment(segment)
+        segments = [s for s in segments if s >= self.head_segment]
+        if segments:
+            self.active_segment = segments[-1]
+        else:
+            self.active_segment = max(self.head_segment, 1)
+            self.head_segment, self.head_offset = self.active_segment, 0
+
+        # Stream every record once: the windows keep only the two ends
+        ticket = 0
+        for segment in segments:
+            start = self.head_offset if segment == self.head_segment else 0
+            self.damaged = None
+            corrupt = len(self.corrupt)
+            for event, begin, end in self._records(segment, start):
+                ticket += 1
+                self._push((event, segment, begin, end, ticket))
+                if isinstance(event.get('id'), int):
+                    self.last_event_id = max(self.last_event_id, event['id'])
+            if not self.damaged:
+                continue
+            if segment == segments[-1] and len(self.corrupt) == corrupt:
+                # Torn write at the end of the log: cut it off
+                with open(self._segment_path(segment), 'r+b') as f:
+                    f.truncate(self.damaged[1])
+            else:
+                # A sealed segment, or framing after a corrupt record: keep it as evidence
+                self.corrupt.append(self.damaged)
+        self.written = self.synced = ticket
+        self._open_active()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed event queue and history store.
+
+An alternative to EventLog for FIMState: events stay on disk in a WAL-mode
+database instead of in memory, and acknowledged events are kept as history
+rather than discarded. The event itself is stored as an encrypted payload;
+the only plaintext beside it is the event id and ack time. Paths are
+searchable through keyed tokens (HMAC of the path and of each ancestor
+directory), and time ranges by bisecting the rows, which are in queue order.
+"""
+import os
+import sys
+import hmac
+import json
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+EVENT_DB_FILE = 'events.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id,
+    acked_at TEXT,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_event_id ON events(event_id);
+CREATE INDEX IF NOT EXISTS events_pending ON events(seq) WHERE acked_at IS NULL;
+CREATE TABLE IF NOT EXISTS event_paths (
+    token BLOB NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (token, seq)
+) WITHOUT ROWID;
+"""
+PLAINTEXT_COLUMNS = ('path', 'event_type', 'ts')  # index columns of databases written by older clients
+
+
+def path_keys(path):
+    """path and each of its ancestor directories (with trailing '/'), with '/' separators"""
+    path = path.replace('\\', '/')
+    keys = {path.rstrip('/') or '/'}
+    keys.update(path[:i + 1] for i, ch in enumerate(path) if ch == '/')
+    return keys
+
+
+class SQLiteEventStore:
+    """
+    Event queue + acknowledged history in SQLite, with the EventLog interface
+    (append/sync/peek/pop/last, len and iteration over pending events).
+
+    Appends go into an open transaction that is committed as a group, on
+    sync() or after commit_window seconds / commit_batch rows. Tickets are
+    row sequence numbers; only committed rows are visible to peek()/pop().
+
+    index_key (bytes) keys the path tokens; without it paths are not
+    indexed. read_only opens an existing database for history queries.
+    """
+
+    def __init__(self, db_file, encrypt, decrypt, logger=None, commit_window=0.005, commit_batch=256,
+                 index_key=None, read_only=False):
+        self.db_file = db_file
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.index_key = index_key
+        self.logger = logger or logging.getLogger(__name__)
+        self.commit_window = commit_window
+        self.commit_batch = commit_batch
+
+        self.io_lock = threading.Lock()
+        self.in_transaction = False
+        self.written = 0
+        self.synced = 0
+        self.timer = None
+        self.syncs = 0
+
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True,
+                                        check_same_thread=False, isolation_level=None)
+        else:
+            os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+            if sys.platform != 'win32':
+                # SQLite gives the -wal/-shm files the database file's mode,
+                # so create it restricted before the first connect
+                os.close(os.open(db_file, os.O_RDWR | os.O_CREAT, 0o600))
+                for path in (db_file, db_file + '-wal', db_file + '-shm'):
+                    if os.path.exists(path):
+                        os.chmod(path, 0o600)
+            self.conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=FULL')
+            self.conn.execute('PRAGMA secure_delete=ON')
+            self.conn.executescript(SCHEMA)
+            self._drop_plaintext_columns()
+
+        row = self.conn.execute(
+            "SELECT COUNT(*), MAX(seq) FROM events WHERE acked_at IS NULL").fetchone()
+        self.count = row[0]
+        self.written = self.synced = self.conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        self.tail = self._load_row("SELECT payload FROM events WHERE seq = ?", (row[1],)) if row[1] else None
+        self.head = None
+        self.last_event_id = self.conn.execute(
+            "SELECT COALESCE(MAX(event_id), 0) FROM events WHERE typeof(event_id) = 'integer'").fetchone()[0]
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Pending events, oldest first, read in chunks (rows added meanwhile are not included)"""
+        after = 0
+        upper = self.written
+        while True:
+            with self.io_lock:
+                rows = self.conn.execute(
+                    "SELECT seq, payload FROM events WHERE acked_at IS NULL AND seq > ? AND seq <= ? "
+                    "ORDER BY seq LIMIT 1000", (after, upper)).fetchall()
+            if not rows:
+                return
+            for seq, payload in rows:
+                yield self._decode(payload)
+            after = rows[-1][0]
+
+    def peek(self):
+        with self.io_lock:
+            return self._peek_row()[1]
+
+    def last(self):
+        return self.tail
+
+    def append(self, event):
+        """Insert one event into the open group transaction and return its ticket"""
+        payload = self.encrypt(json.dumps(event, separators=(',', ':')).encode('utf-8'))
+        with self.io_lock:
+            if not self.in_transaction:
+                self.conn.execute('BEGIN')
+                self.in_transaction = True
+            ticket = self.written = self._insert(event, payload)
+            self.count += 1
+            self.tail = event
+            backlog = ticket - self.synced
+
+        if isinstance(event.get('id'), int):
+            self.last_event_id = max(self.last_event_id, event['id'])
+
+        if backlog >= self.commit_batch:
+            self.sync(ticket)
+        elif self.commit_window:
+            self._schedule_sync()
+        return ticket
+
+    def sync(self, ticket=None):
+        """Commit the open transaction if the ticket (default: all) is not yet durable"""
+        with self.io_lock:
+            if ticket is not None and self.synced >= ticket:
+                return
+            self._commit()
+
+    def rewrite(self, events):
+        """
+        Replace the pending queue with events (an iterable that may stream
+        from this store) in a single transaction. Superseded pending rows
+        are deleted; acknowledged history is untouched.
+        """
+        self.sync()
+        with self.io_lock:
+            upper = last = self.written
+            self.conn.execute('BEGIN')
+        try:
+            for event in events:
+                payload = self.encrypt(json.dumps(event, separators=(',', ':')).encode('utf-8'))
+                with self.io_lock:
+                    last = self._insert(event, payload)
+            with self.io_lock:
+                self.conn.execute("DELETE FROM event_paths WHERE seq IN "
+                                  "(SELECT seq FROM events WHERE acked_at IS NULL AND seq <= ?)", (upper,))
+                self.conn.execute("DELETE FROM events WHERE acked_at IS NULL AND seq <= ?", (upper,))
+                self.conn.execute('COMMIT')
+        except Exception:
+            with self.io_lock:
+                self.conn.execute('ROLLBACK')
+            raise
+
+        with self.io_lock:
+            self.written = self.synced = last
+            row = self.conn.execute(
+                "SELECT COUNT(*), MAX(seq) FROM events WHERE acked_at IS NULL").fetchone()
+            self.count = row[0]
+            self.tail = self._load_row("SELECT payload FROM events WHERE seq = ?", (row[1],)) if row[1] else None
+            self.head = None
+
+    def import_events(self, events):
+        """
+        Insert events from another queue in one transaction, skipping any
+        whose event id is already stored (so an interrupted migration can
+        simply be repeated). Returns the number inserted.
+        """
+        self.sync()
+        added = 0
+        with self.io_lock:
+            self.conn.execute('BEGIN')
+            try:
+                for event in events:
+                    payload = self.encrypt(json.dumps(event, separators=(',', ':')).encode('utf-8'))
+                    if self._insert(event, payload, ignore_existing=True):
+                        added += 1
+                        if isinstance(event.get('id'), int):
+                            self.last_event_id = max(self.last_event_id, event['id'])
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            if added:
+                row = self.conn.execute(
+                    "SELECT COUNT(*), MAX(seq) FROM events WHERE acked_at IS NULL").fetchone()
+                self.count = row[0]
+                self.written = self.synced = self.conn.execute("SELECT MAX(seq) FROM events").fetchone()[0]
+                self.tail = self._load_row("SELECT payload FROM events WHERE seq = ?", (row[1],)) if row[1] else None
+                self.head = None
+        return added
+
+    def peek_many(self, count):
+        """Up to count of the oldest committed pending events, without removing them"""
+        with self.io_lock:
+            rows = self.conn.execute(
+                "SELECT payload FROM events WHERE acked_at IS NULL AND seq <= ? ORDER BY seq LIMIT ?",
+                (self.synced, int(count))).fetchall()
+        return [self._decode(row[0]) for row in rows]
+
+    def pop(self):
+        """Mark the oldest committed pending event acknowledged"""
+        events = self.pop_many(1)
+        return events[0] if events else None
+
+    def pop_many(self, count):
+        """Mark up to count of the oldest committed pending events acknowledged in one commit"""
+        with self.io_lock:
+            rows = self.conn.execute(
+                "SELECT seq, payload FROM events WHERE acked_at IS NULL AND seq <= ? ORDER BY seq LIMIT ?",
+                (self.synced, int(count))).fetchall()
+            if not rows:
+                return []
+            if not self.in_transaction:
+                self.conn.execute('BEGIN')
+                self.in_transaction = True
+            self.conn.execute("UPDATE events SET acked_at = ? WHERE acked_at IS NULL AND seq <= ?",
+                              (datetime.now().isoformat(), rows[-1][0]))
+            self._commit()
+            self.head = None
+            self.count -= len(rows)
+            if not self.count:
+                self.tail = None
+            return [self._decode(row[1]) for row in rows]
+
+    def history(self, path_prefix=None, since=None, until=None, limit=None, pending=None):
+        """
+        Events (acknowledged and pending) oldest first. path_prefix is a
+        file or a directory, matched on whole path components through the
+        path tokens. since/until are ISO timestamps or datetimes compared
+        with the time each event was queued. pending=True/False restricts
+        to queued or acknowledged events.
+        """
+        if path_prefix and not self.index_key:
+            self.logger.warning("Event history has no path index key; cannot search by path")
+            return []
+        with self.io_lock:
+            clauses, params = [], []
+            if since:
+                clauses.append("seq >= ?")
+                params.append(self._seq_at(since))
+            if until:
+                clauses.append("seq < ?")
+                params.append(self._seq_at(until))
+            if path_prefix:
+                path = path_prefix.replace('\\', '/').rstrip('/')
+                tokens = {self._token(path or '/'), self._token(path + '/')}
+                clauses.append(f"seq IN (SELECT seq FROM event_paths WHERE token IN ({', '.join('?' * len(tokens))}))")
+                params += list(tokens)
+            if pending is not None:
+                clauses.append("acked_at IS NULL" if pending else "acked_at IS NOT NULL")
+            sql = "SELECT payload, acked_at FROM events"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += " ORDER BY seq"
+            if limit:
+                sql += f" LIMIT {int(limit)}"
+            rows = self.conn.execute(sql, params).fetchall()
+        events = []
+        for payload, acked_at in rows:
+            event = self._decode(payload)
+            event['acked_at'] = acked_at
+            events.append(event)
+        return events
+
+    def close(self):
+        with self.io_lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            self._commit()
+            self.conn.close()
+
+    def _insert(self, event, payload, ignore_existing=False):
+        """Insert a row and its path tokens; returns its seq, or None if ignore_existing found the event id"""
+        if ignore_existing:
+            cursor = self.conn.execute(
+                "INSERT INTO events (event_id, payload) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM events WHERE event_id = ?)",
+                (event.get('id'), payload, event.get('id')))
+            if not cursor.rowcount:
+                return None
+        else:
+            cursor = self.conn.execute("INSERT INTO events (event_id, payload) VALUES (?, ?)",
+                                       (event.get('id'), payload))
+        seq = cursor.lastrowid
+        if self.index_key:
+            self.conn.executemany("INSERT OR IGNORE INTO event_paths (token, seq) VALUES (?, ?)",
+                                  [(token, seq) for token in self._path_tokens(event)])
+        return seq
+
+    def _path_tokens(self, event):
+        keys = set()
+        for path in (event.get('file_path'), event.get('old_path')):
+            if path:
+                keys |= path_keys(path)
+        return set(self._token(key) for key in keys)
+
+    def _token(self, key):
+        return hmac.new(self.index_key, key.encode('utf-8'), hashlib.sha256).digest()[:16]
+
+    def _seq_at(self, when):
+        """
+        The lowest seq queued at or after when, for use as a bound. Rows
+        are appended in queue order, so this is a bisection that decrypts
+        O(log n) rows.
+        """
+        when = when.isoformat() if isinstance(when, datetime) else when
+        low, high = self.conn.execute(
+            "SELECT COALESCE(MIN(seq), 1), COALESCE(MAX(seq), 0) + 1 FROM events").fetchone()
+        while low < high:
+            row = self.conn.execute("SELECT seq, payload FROM events WHERE seq >= ? ORDER BY seq LIMIT 1",
+                                    ((low + high) // 2,)).fetchone()
+            if row is None or row[0] >= high:
+                high = (low + high) // 2
+                continue
+            event = self._decode(row[1])
+            if (event.get('queued_at') or event.get('timestamp') or '') >= when:
+                high = row[0]
+            else:
+                low = row[0] + 1
+        return low
+
+    def _drop_plaintext_columns(self):
+        """Rebuild a table written by an older client without its plaintext path/type/time columns"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(events)")]
+        if not any(column in columns for column in PLAINTEXT_COLUMNS):
+            return
+        rows = self.conn.execute("SELECT seq, payload FROM events").fetchall()
+        counter = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        self.conn.execute('BEGIN')
+        try:
+            if self.index_key:
+                for seq, payload in rows:
+                    self.conn.executemany("INSERT OR IGNORE INTO event_paths (token, seq) VALUES (?, ?)",
+                                          [(token, seq) for token in self._path_tokens(self._decode(payload))])
+            self.conn.execute("ALTER TABLE events RENAME TO events_plaintext")
+            self.conn.execute("DROP INDEX IF EXISTS events_event_id")
+            self.conn.execute("DROP INDEX IF EXISTS events_pending")
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self.conn.execute(statement)
+            self.conn.execute("INSERT INTO events (seq, event_id, acked_at, payload) "
+                              "SELECT seq, event_id, acked_at, payload FROM events_plaintext")
+            self.conn.execute("DROP TABLE events_plaintext")
+            if counter:
+                self.conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'events'", counter)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        # secure_delete zeroed the freed pages; rewrite the file and the WAL as well
+        self.conn.execute('VACUUM')
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.logger.info(f"Removed plaintext index columns from {os.path.basename(self.db_file)}")
+
+    def _peek_row(self):
+        if self.head is None:
+            row = self.conn.execute(
+                "SELECT seq, payload FROM events WHERE acked_at IS NULL ORDER BY seq LIMIT 1").fetchone()
+            if row is None:
+                return None, None
+            self.head = (row[0], self._decode(row[1]))
+        if self.head[0] > self.synced:
+            return None, None
+        return self.head
+
+    def _commit(self):
+        if self.in_transaction:
+            self.conn.execute('COMMIT')
+            self.in_transaction = False
+            self.syncs += 1
+        self.synced = self.written
+
+    def _schedule_sync(self):
+        with self.io_lock:
+            if self.timer is None:
+                self.timer = threading.Timer(self.commit_window, self._timed_sync)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _timed_sync(self):
+        with self.io_lock:
+            self.timer = None
+        try:
+            self.sync()
+        except sqlite3.Error as e:
+            self.logger.error(f"Event store group commit failed: {e}")
+
+    def _load_row(self, sql, params):
+        row = self.conn.execute(sql, params).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def _decode(self, payload):
+        return json.loads(self.decrypt(payload))
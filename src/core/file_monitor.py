@@ -2,16 +2,16 @@
 """
 File monitor for creating Merkle trees and detecting changes
 """
+import os
 import time
 from datetime import datetime
 
-from core.merkle import build_merkle_tree, get_merkle_path
-from core.utils import sha256_file
+from core.merkle import MerkleTree, get_merkle_path
+from core.utils import sha256_file, stat_tag
 
 class FileMonitor:
     def __init__(self, tree, files, config, state, log_callback, event_queue_mgr, lock):
-        self.tree = tree
-        self.files = files
+        self.tree = tree if tree is not None else MerkleTree()
         self.config = config
         self.state = state
         self.log_callback = log_callback
@@ -19,6 +19,11 @@ class FileMonitor:
         self.lock = lock
         self.deregistered = False
 
+    @property
+    def files(self):
+        """Tracked (path, hash) pairs in path order; supports len() and iteration"""
+        return self.tree
+
     def log_to_gui(self, message, status="info"):
         self.log_callback({
             'type': 'log',
@@ -34,53 +39,165 @@ class FileMonitor:
         time.sleep(0.1) 
         
         with self.lock:
-            h = None
-            if not is_deleted:
-                h = sha256_file(file_path)
-                if not h:
-                    self.config.logger.warning(f"Could not hash {file_path} - skipping")
-                    return
-            
-            file_index = -1
-            old_hash = None
-            for i, (path, file_hash) in enumerate(self.files):
-                if path == file_path:
-                    file_index = i
-                    old_hash = file_hash
-                    break
-            
-            if is_deleted:
-                if file_index < 0:
-                    return
-                self.files.pop(file_index)
-            elif file_index >= 0:
-                if old_hash == h:
-                    return
-                self.files[file_index] = (file_path, h)
-            else:
-                self.files.append((file_path, h))
-            
-            self.tree, self.files = build_merkle_tree(self.files)
-            path_info = get_merkle_path(self.tree, self.files, file_path)
-            
-            event_data = {
-                'client_id': self.config.host_id,
-                'event_type': 'deleted' if is_deleted else ('modified' if file_index >= 0 else 'created'),
-                'file_path': file_path,
-                'old_hash': old_hash.hex() if old_hash else None,
-                'new_hash': h.hex() if h else None,
-                'root_hash': path_info['root_hash'].hex() if path_info else None,
-                'merkle_proof': {
-                    'path': [p.hex() for p in path_info['path']] if path_info else [],
-                    'index': path_info['index'] if path_info else 0
-                } if path_info else None,
-                'last_valid_hash': self.state.get_last_valid_hash(),
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            
-            self.state.enqueue_event(event_data)
-            self.log_to_gui(f"Queued: {event_data['event_type']} - {file_path}", "info")
-            self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
-            
-            self.event_queue_mgr.start_processing()
+            queued = self._apply_change(file_path, is_deleted)
+        if queued:
+            self.notify_queued()
+
+    def detect_move(self, src_path, dest_path, is_directory=False):
+        """Apply a rename synchronously (the pipeline runs the same steps on its threads)"""
+        if self.deregistered:
+            return
+
+        if is_directory:
+            with self.lock:
+                moved = self.commit_directory_move(src_path, dest_path)
+            stale = [new for _, new, _ in moved if self.needs_rehash(new)]
+            queued = bool(moved)
+            for path in stale:
+                with self.lock:
+                    queued = self._apply_change(path, False) or queued
+        else:
+            h, tag = self.hash_move(src_path, dest_path)
+            with self.lock:
+                queued = self.commit_move(src_path, dest_path, h, tag)
+            if queued is None:
+                with self.lock:
+                    queued = self._apply_change(dest_path, False)
+        if queued:
+            self.notify_queued()
+
+    def hash_change(self, file_path, is_deleted):
+        """
+        Hash the current contents of file_path (no lock needed).
+        Returns (hash, tag, is_deleted); a path that vanished before it could
+        be hashed is reported as deleted, other failures return (None, 0, False).
+        """
+        if is_deleted:
+            return None, 0, True
+        try:
+            tag = stat_tag(os.stat(file_path))
+        except OSError:
+            tag = 0
+        h = sha256_file(file_path)
+        if not h:
+            if not os.path.exists(file_path):
+                return None, 0, True
+            self.config.logger.warning(f"Could not hash {file_path} - skipping")
+        return h, tag, False
+
+    def hash_move(self, src_path, dest_path):
+        """
+        Prepare a file rename: returns (hash, tag) for dest_path. The content
+        is only read when src_path is tracked under a different inode or size;
+        otherwise hash is None and commit_move decides what to do.
+        """
+        try:
+            tag = stat_tag(os.stat(dest_path))
+        except OSError:
+            return None, 0
+        with self.lock:
+            known = self.tree.get_tag(src_path)
+        if known is None or known == tag:
+            return None, tag
+        return sha256_file(dest_path), tag
+
+    def needs_rehash(self, file_path):
+        """Whether file_path's inode or size no longer match the tag stored in the tree"""
+        try:
+            tag = stat_tag(os.stat(file_path))
+        except OSError:
+            return True
+        with self.lock:
+            return self.tree.get_tag(file_path) != tag
+
+    def _apply_change(self, file_path, is_deleted):
+        """Rehash file_path, update the tree and enqueue an event; returns True if one was queued"""
+        h, tag, is_deleted = self.hash_change(file_path, is_deleted)
+        if h is None and not is_deleted:
+            return False
+        return self.commit_change(file_path, h, is_deleted, tag)
+
+    def commit_change(self, file_path, h, is_deleted, tag=0):
+        """Apply a hashed change to the tree and enqueue its event (caller holds self.lock)"""
+        old_hash = self.tree.get(file_path)
+        
+        # Incremental updates: only the touched leaf-to-root paths are rehashed
+        if is_deleted:
+            if old_hash is None:
+                return False
+            self.tree.remove(file_path)
+        else:
+            self.tree.set(file_path, h, tag)
+            if old_hash == h:
+                return False
+        
+        self._enqueue(file_path, 'deleted' if is_deleted else ('modified' if old_hash is not None else 'created'),
+                      old_hash, h)
+        return True
+
+    def commit_move(self, src_path, dest_path, h, tag):
+        """
+        Re-key src_path's leaf to dest_path and enqueue a 'moved' event
+        (caller holds self.lock). h is the new digest if the content had to
+        be re-verified, else None to keep the tracked one.
+        Returns None when dest_path still has to be hashed as a plain change.
+        """
+        old_hash = self.tree.get(src_path)
+        if old_hash is None:
+            # Untracked source: either a directory move already re-keyed
+            # dest_path, or the file is new to us and must be read
+            if h is not None:
+                return self.commit_change(dest_path, h, False, tag)
+            if tag and self.tree.get_tag(dest_path) == tag:
+                return False
+            return None
+
+        new_hash = h if h is not None else old_hash
+        self.tree.remove(src_path)
+        self.tree.set(dest_path, new_hash, tag)
+        self._enqueue(dest_path, 'moved', old_hash, new_hash, old_path=src_path)
+        return True
+
+    def commit_directory_move(self, src_dir, dest_dir):
+        """
+        Re-key every leaf under src_dir to dest_dir and enqueue one batched
+        'moved' event (caller holds self.lock). Returns [(old, new, hash)] so
+        the caller can re-verify files whose identity tag changed.
+        """
+        src_prefix = src_dir.rstrip('/\\') + os.sep
+        dest_prefix = dest_dir.rstrip('/\\') + os.sep
+        moved = self.tree.move_prefix(src_prefix, dest_prefix)
+        if moved:
+            self._enqueue(dest_dir, 'moved', None, None, old_path=src_dir, file_count=len(moved),
+                          root_hash=self.tree.root_hash.hex() if self.tree.root_hash else None)
+        return moved
+
+    def _enqueue(self, file_path, event_type, old_hash, h, **extra):
+        """Build the signed event for a committed tree change and queue it"""
+        path_info = get_merkle_path(self.tree, file_path)
+        
+        event_data = {
+            'client_id': self.config.host_id,
+            'event_type': event_type,
+            'file_path': file_path,
+            'old_hash': old_hash.hex() if old_hash else None,
+            'new_hash': h.hex() if h else None,
+            'root_hash': path_info['root_hash'].hex() if path_info else None,
+            'merkle_proof': {
+                'path': [p.hex() for p in path_info['path']] if path_info else [],
+                'index': path_info['index'] if path_info else 0
+            } if path_info else None,
+            'last_valid_hash': self.state.get_last_valid_hash(),
+            'timestamp': datetime.now().isoformat()
+        }
+        event_data.update(extra)
+        
+        self.state.enqueue_event(event_data, wait=False)
+        self.log_to_gui(f"Queued: {event_type} - {file_path}", "info")
+
+    def notify_queued(self):
+        """Make queued events durable, publish the new queue size and start draining it"""
+        # The drain (or, offline, the batch timer) seals the open batch
+        self.state.flush_events(seal_batch=False)
+        self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
+        self.event_queue_mgr.start_processing()
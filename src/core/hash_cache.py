@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Persistent stat-keyed hash cache so restarts don't rehash unchanged files.
+Entries map path -> (st_dev, st_ino, size, mtime_ns, ctime_ns, digest) and the
+file is HMAC-protected with a key derived from the device private key.
+"""
+import os
+import hmac
+import struct
+import hashlib
+import logging
+
+from core.utils import sha256_file
+
+HASH_CACHE_NAME = 'hash_cache.bin'
+CACHE_MAGIC = b'FIMHC1\n'
+FINGERPRINT = struct.Struct('<QQQqq')
+PATH_LEN = struct.Struct('<H')
+DIGEST_SIZE = 32
+RECORD_SIZE = FINGERPRINT.size + DIGEST_SIZE
+
+
+def fingerprint(st):
+    """Pack the stat fields that must be unchanged for a cached digest to be reused"""
+    return FINGERPRINT.pack(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+class HashCache:
+    """
+    Path -> fingerprint + digest cache used by the initial scan.
+
+    lookup() consumes entries from the loaded cache and store() records the
+    digests of this scan, so save() drops paths that no longer exist.
+    Cache hits are kept in `pending` until verify_pending() has rehashed them.
+    """
+
+    def __init__(self, cache_file, key, logger=None):
+        self.cache_file = cache_file
+        self.key = key
+        self.logger = logger or logging.getLogger(__name__)
+        self.entries = self._load()
+        self.fresh = {}
+        self.pending = []
+
+    @classmethod
+    def for_state(cls, state, logger=None):
+        """Cache stored next to state.json, keyed by the device signer"""
+        cache_file = os.path.join(os.path.dirname(state.state_file), HASH_CACHE_NAME)
+        return cls(cache_file, state.device_signer.derive_key(b'fim-hash-cache'), logger)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _load(self):
+        """Read and authenticate the cache file; any failure means a cold start"""
+        try:
+            with open(self.cache_file, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+        except OSError as e:
+            self.logger.warning(f"Hash cache unreadable, rescanning: {e}")
+            return {}
+
+        body, mac = data[:-DIGEST_SIZE], data[-DIGEST_SIZE:]
+        if not body.startswith(CACHE_MAGIC) or not hmac.compare_digest(mac, self._mac(body)):
+            self.logger.warning("Hash cache failed integrity check, rescanning all files")
+            return {}
+
+        entries = {}
+        view = memoryview(body)
+        pos = len(CACHE_MAGIC)
+        try:
+            while pos < len(body):
+                (length,) = PATH_LEN.unpack_from(view, pos)
+                pos += PATH_LEN.size
+                path = bytes(view[pos:pos + length]).decode('utf-8', 'surrogatepass')
+                pos += length
+                entries[path] = bytes(view[pos:pos + RECORD_SIZE])
+                pos += RECORD_SIZE
+        except (struct.error, UnicodeDecodeError):
+            self.logger.warning("Hash cache is malformed, rescanning all files")
+            return {}
+        return entries
+
+    def _mac(self, body):
+        return hmac.new(self.key, body, hashlib.sha256).digest()
+
+    def lookup(self, path, st):
+        """Return the cached digest if path's fingerprint is unchanged, else None"""
+        record = self.entries.pop(path, None)
+        if record is None or record[:FINGERPRINT.size] != fingerprint(st):
+            return None
+        self.fresh[path] = record
+        self.pending.append(path)
+        return record[FINGERPRINT.size:]
+
+    def store(self, path, st, digest):
+        """Record the digest computed for path from stat result st (taken before hashing)"""
+        self.fresh[path] = fingerprint(st) + digest
+
+    def save(self):
+        """Replace the cache with this scan's entries, evicting paths not seen"""
+        self.entries, self.fresh = self.fresh, {}
+        chunks = [CACHE_MAGIC]
+        for path, record in self.entries.items():
+            encoded = path.encode('utf-8', 'surrogatepass')
+            chunks.append(PATH_LEN.pack(len(encoded)))
+            chunks.append(encoded)
+            chunks.append(record)
+        body = b''.join(chunks)
+
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+                f.write(self._mac(body))
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            self.logger.warning(f"Failed to save hash cache: {e}")
+
+    def verify_pending(self, on_mismatch=None, stop_event=None):
+        """
+        Rehash files whose digest came from the cache.
+        Files whose content no longer matches are refreshed in the cache and
+        passed to on_mismatch(path); files changed since the scan are left to
+        the watcher. Returns the number of mismatches found.
+        """
+        mismatches = 0
+        pending, self.pending = self.pending, []
+        for path in pending:
+            if stop_event and stop_event.is_set():
+                break
+            record = self.entries.get(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if record is None or record[:FINGERPRINT.size] != fingerprint(st):
+                continue
+            digest = sha256_file(path, drop_cache=True)
+            if digest is None or digest == record[FINGERPRINT.size:]:
+                continue
+            mismatches += 1
+            self.entries[path] = fingerprint(st) + digest
+            self.logger.warning(f"Cached hash mismatch for unchanged file: {path}")
+            if on_mismatch:
+                on_mismatch(path)
+
+        if mismatches:
+            self.fresh = dict(self.entries)
+            self.save()
+        return mismatches
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP session for all traffic to the FIM server.
+
+Every request (events, acks, heartbeats, registration) goes through one
+requests.Session so TCP+TLS connections are kept alive and reused from a
+bounded pool instead of being opened per call. Certificate verification
+(the pinned config.server_cert, or the system CAs) is applied here once.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HTTPSessionManager:
+    """Lazily built, pooled requests.Session; reset() drops it and its connections"""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self._session = None
+
+    @property
+    def verify(self):
+        """Pinned server certificate if configured, else default CA verification"""
+        return self.config.server_cert if self.config.server_cert else True
+
+    def session(self):
+        with self.lock:
+            if self._session is None:
+                # One connection per in-flight report, so a send window never opens throwaway connections
+                pool_size = max(getattr(self.config, 'http_pool_size', 4), getattr(self.config, 'queue_send_window', 1))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.verify = self.verify
+                self._session = session
+            return self._session
+
+    def post(self, path, **kwargs):
+        """POST to server_url + path (or an absolute URL) over a pooled connection"""
+        url = path if path.startswith(('http://', 'https://')) else f"{self.config.server_url}{path}"
+        kwargs.setdefault('verify', self.verify)
+        return self.session().post(url, **kwargs)
+
+    def reset(self):
+        """Close pooled connections; the next request builds a fresh session"""
+        with self.lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Lock hold-time instrumentation.
+
+InstrumentedLock wraps a (re-entrant) lock and reports, for each outermost
+acquire/release, the function that took it, how long it waited and how long
+it held the lock to an observer callable. LockStats is an observer that
+aggregates those reports per call site.
+"""
+import sys
+import time
+import threading
+
+
+class InstrumentedLock:
+    """
+    Drop-in wrapper for threading.RLock: observer(site, waited, held) is
+    called after the outermost release, with times in seconds.
+    """
+
+    def __init__(self, observer, lock=None):
+        self.observer = observer
+        self._lock = lock or threading.RLock()
+        self._depth = 0
+        self._site = None
+        self._waited = 0.0
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        return self._acquire(sys._getframe(1).f_code.co_name, blocking, timeout)
+
+    def release(self):
+        self._depth -= 1
+        if self._depth:
+            self._lock.release()
+            return
+        held = time.perf_counter() - self._acquired_at
+        site, waited = self._site, self._waited
+        self._lock.release()
+        try:
+            self.observer(site, waited, held)
+        except Exception:
+            pass
+
+    def __enter__(self):
+        self._acquire(sys._getframe(1).f_code.co_name, True, -1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _acquire(self, site, blocking, timeout):
+        start = time.perf_counter()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            self._acquired_at = time.perf_counter()
+            self._waited = self._acquired_at - start
+            self._site = site
+        return True
+
+
+class LockStats:
+    """Observer for InstrumentedLock: count, total/max hold and total wait per site"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sites = {}
+
+    def __call__(self, site, waited, held):
+        with self._lock:
+            stats = self.sites.get(site)
+            if stats is None:
+                stats = self.sites[site] = {'count': 0, 'held': 0.0, 'max_held': 0.0, 'waited': 0.0}
+            stats['count'] += 1
+            stats['held'] += held
+            stats['waited'] += waited
+            stats['max_held'] = max(stats['max_held'], held)
+
+    def report(self):
+        """One line per site, longest total hold first"""
+        lines = []
+        with self._lock:
+            ordered = sorted(self.sites.items(), key=lambda item: -item[1]['held'])
+            for site, stats in ordered:
+                lines.append(f"{site:28} {stats['count']:8} held {stats['held'] * 1000:9.1f} ms "
+                             f"(max {stats['max_held'] * 1000:7.3f} ms) waited {stats['waited'] * 1000:9.1f} ms")
+        return "\n".join(lines)
@@ -1,112 +1,601 @@
 #!/usr/bin/env python3
+"""
+Order-preserving Merkle tree keyed by file path.
+
+Leaves are kept in path order and every internal node hashes exactly two
+children with sha256(left + right). The shape is a Cartesian tree over the
+gaps between adjacent leaves, prioritised by a hash of the path to the right
+of each gap (a leaf-oriented treap). Because the shape only depends on the
+set of paths, the root is deterministic for a given set of (path, hash)
+pairs, and inserts, deletes and modifications only rehash the O(log n)
+nodes they touch instead of shifting every later leaf.
+
+The priority hash is keyed with a per-device secret (priority_key), so
+whoever can name files in the watched directory cannot choose paths whose
+priorities degenerate the tree into a list. Tree operations are iterative
+either way, so even a badly shaped tree is only slow, never corrupted.
+
+Storage is array-backed: digests live in contiguous bytearrays of 32-byte
+slots, links in int32 arrays, and paths in a PathTable of interned
+directory prefixes plus packed basenames, so a tree costs a few dozen bytes
+per file instead of several Python objects per node.
+"""
+import hmac
 import hashlib
+from array import array
+
+DIGEST_SIZE = 32
+
+_EMPTY = -1
+_DELETED = -2
+
+
+def _encode_path(path):
+    """Path str -> bytes; surrogatepass round-trips every str os.fsdecode can produce"""
+    return path.encode('utf-8', 'surrogatepass')
+
+
+def _decode_path(key):
+    return key.decode('utf-8', 'surrogatepass')
+
+
+def _priority(key, priority_key=None):
+    """Deterministic heap priority for the gap to the left of `key`"""
+    if priority_key is None:
+        digest = hashlib.sha256(key).digest()
+    else:
+        digest = hmac.new(priority_key, key, hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], 'big')
 
-def build_merkle_tree(files):
+
+class PathTable:
     """
-    Build a Merkle tree from a list of (file_path, hash) tuples.
-    Returns (tree, files) where tree is a list of levels.
+    Leaf id -> path bytes storage with an O(1) path -> leaf id index.
+    Directory prefixes are interned and reference-counted; basenames are
+    packed into one bytearray and compacted once half of it is dead.
     """
-    if not files:
-        return None, files
-    
-    # Sort files by path for consistency
-    files.sort(key=lambda x: x[0])
-    
-    # Leaf level: hashes of files
-    leaves = [h for _, h in files]
-    
-    if not leaves:
-        return None, files
-    
-    tree = [leaves]
-    current_level = leaves
-    
-    while len(current_level) > 1:
-        next_level = []
-        
-        for i in range(0, len(current_level), 2):
-            left = current_level[i]
-            right = current_level[i + 1] if i + 1 < len(current_level) else left
-            parent = hashlib.sha256(left + right).digest()
-            next_level.append(parent)
-        
-        tree.insert(0, next_level)
-        current_level = next_level
-    
-    return tree, files
-
-def update_merkle_tree(tree, changed_index, new_hash):
+
+    def __init__(self):
+        self.prefixes = []
+        self.prefix_ids = {}
+        self.prefix_refs = array('i')
+        self.free_prefixes = []
+        self.prefix_of = array('i')      # per leaf id, -1 when free
+        self.name_offsets = array('I')
+        self.name_lengths = array('H')
+        self.names = bytearray()
+        self.dead_bytes = 0
+        self.free_ids = []
+        self.count = 0
+        self.index = array('i', [_EMPTY]) * 8   # open addressing, linear probing
+        self.index_used = 0                     # live + deleted slots
+
+    def __len__(self):
+        return self.count
+
+    def key(self, leaf_id):
+        """Full path bytes for a live leaf id"""
+        offset = self.name_offsets[leaf_id]
+        return self.prefixes[self.prefix_of[leaf_id]] + self.names[offset:offset + self.name_lengths[leaf_id]]
+
+    def find(self, key):
+        """Leaf id for path bytes, or -1"""
+        return self._probe(key)[1]
+
+    def add(self, key):
+        """Store path bytes that are not present yet and return the new leaf id"""
+        if (self.index_used + 1) * 3 > len(self.index) * 2:
+            self._resize_index()
+        slot, _ = self._probe(key)
+
+        split = max(key.rfind(b'/'), key.rfind(b'\\')) + 1
+        prefix, name = key[:split], key[split:]
+        prefix_id = self.prefix_ids.get(prefix)
+        if prefix_id is None:
+            if self.free_prefixes:
+                prefix_id = self.free_prefixes.pop()
+                self.prefixes[prefix_id] = prefix
+            else:
+                prefix_id = len(self.prefixes)
+                self.prefixes.append(prefix)
+                self.prefix_refs.append(0)
+            self.prefix_ids[prefix] = prefix_id
+        self.prefix_refs[prefix_id] += 1
+
+        if self.free_ids:
+            leaf_id = self.free_ids.pop()
+            self.prefix_of[leaf_id] = prefix_id
+            self.name_offsets[leaf_id] = len(self.names)
+            self.name_lengths[leaf_id] = len(name)
+        else:
+            leaf_id = len(self.prefix_of)
+            self.prefix_of.append(prefix_id)
+            self.name_offsets.append(len(self.names))
+            self.name_lengths.append(len(name))
+        self.names += name
+
+        if self.index[slot] == _EMPTY:
+            self.index_used += 1
+        self.index[slot] = leaf_id
+        self.count += 1
+        return leaf_id
+
+    def remove(self, leaf_id):
+        """Forget a live leaf id and release its name and prefix"""
+        slot, _ = self._probe(self.key(leaf_id))
+        self.index[slot] = _DELETED
+
+        prefix_id = self.prefix_of[leaf_id]
+        self.prefix_refs[prefix_id] -= 1
+        if self.prefix_refs[prefix_id] == 0:
+            del self.prefix_ids[self.prefixes[prefix_id]]
+            self.prefixes[prefix_id] = b''
+            self.free_prefixes.append(prefix_id)
+
+        self.dead_bytes += self.name_lengths[leaf_id]
+        self.prefix_of[leaf_id] = -1
+        self.name_lengths[leaf_id] = 0
+        self.free_ids.append(leaf_id)
+        self.count -= 1
+
+        if self.dead_bytes > 65536 and self.dead_bytes * 2 > len(self.names):
+            self._compact_names()
+
+    def _probe(self, key):
+        """Return (slot, leaf_id) for key; leaf_id is -1 and slot insertable if absent"""
+        index = self.index
+        mask = len(index) - 1
+        slot = hash(key) & mask
+        reusable = -1
+        while True:
+            leaf_id = index[slot]
+            if leaf_id == _EMPTY:
+                return (reusable if reusable >= 0 else slot), -1
+            if leaf_id == _DELETED:
+                if reusable < 0:
+                    reusable = slot
+            elif self.key(leaf_id) == key:
+                return slot, leaf_id
+            slot = (slot + 1) & mask
+
+    def _resize_index(self):
+        size = 8
+        while size < (self.count + 1) * 2:
+            size *= 2
+        index = array('i', [_EMPTY]) * size
+        mask = size - 1
+        for leaf_id, prefix_id in enumerate(self.prefix_of):
+            if prefix_id < 0:
+                continue
+            slot = hash(self.key(leaf_id)) & mask
+            while index[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            index[slot] = leaf_id
+        self.index = index
+        self.index_used = self.count
+
+    def _compact_names(self):
+        names = bytearray()
+        for leaf_id, prefix_id in enumerate(self.prefix_of):
+            if prefix_id < 0:
+                continue
+            offset = self.name_offsets[leaf_id]
+            self.name_offsets[leaf_id] = len(names)
+            names += self.names[offset:offset + self.name_lengths[leaf_id]]
+        self.names = names
+        self.dead_bytes = 0
+
+
+class MerkleTree:
     """
-    Update Merkle tree after file modification.
-    Modifies the tree in-place and returns the updated tree.
+    Sorted Merkle tree with O(log n) set/remove and O(1) path lookup.
+
+    Node references are ints: >= 0 is an internal node id, < 0 is ~leaf_id.
+    Each internal node records the leaf just right of its gap (the smallest
+    key of its right subtree) and that leaf's priority. Iterating yields
+    (path, hash) tuples in path order.
+
+    Each leaf also carries a 64-bit tag that is not part of any digest; the
+    monitor stores a stat identity there (see utils.stat_tag) so renames can
+    be recognised without rereading the file.
+
+    priority_key (bytes) keys the treap priorities; trees built with the
+    same key and contents have the same root hash. Without one the
+    priorities are a plain hash of the path, which is only safe for
+    paths an attacker cannot choose.
     """
-    if not tree or changed_index >= len(tree[-1]):
+
+    def __init__(self, priority_key=None):
+        self.priority_key = priority_key
+        self.paths = PathTable()
+        self.leaf_digests = bytearray()
+        self.leaf_parent = array('i')
+        self.leaf_tags = array('Q')
+        self.node_digests = bytearray()
+        self.node_left = array('i')
+        self.node_right = array('i')
+        self.node_parent = array('i')
+        self.node_gap = array('i')
+        self.node_priority = array('I')
+        self.free_nodes = []
+        self.root = None
+
+    @classmethod
+    def from_sorted(cls, files, priority_key=None):
+        """Build a tree in O(n) from (path, hash) or (path, hash, tag) tuples sorted by path"""
+        tree = cls(priority_key)
+        tree._set_root(tree._build(
+            (_encode_path(item[0]), item[1], item[2] if len(item) > 2 else 0) for item in files
+        ))
         return tree
-    
-    # Update the leaf node
-    level_idx = len(tree) - 1
-    tree[level_idx][changed_index] = new_hash
-    idx = changed_index
-
-    # Recalculate parent hashes up to root
-    while level_idx > 0:
-        parent_idx = idx // 2
-        left_idx = parent_idx * 2
-        right_idx = left_idx + 1
-
-        level = tree[level_idx]
-        left_hash = level[left_idx]
-        right_hash = level[right_idx] if right_idx < len(level) else left_hash
-
-        parent_hash = hashlib.sha256(left_hash + right_hash).digest()
-        tree[level_idx-1][parent_idx] = parent_hash
-
-        idx = parent_idx
-        level_idx -= 1
-    
-    return tree
-
-def get_merkle_path(tree, files, file_path):
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return self.paths.find(_encode_path(path)) >= 0
+
+    def __iter__(self):
+        """Yield (path, hash) tuples in path order"""
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            ref = pending.pop()
+            if ref < 0:
+                yield _decode_path(self.paths.key(~ref)), bytes(self._digest(ref))
+            else:
+                pending.append(self.node_right[ref])
+                pending.append(self.node_left[ref])
+
+    @property
+    def root_hash(self):
+        return bytes(self._digest(self.root)) if self.root is not None else None
+
+    def get(self, path):
+        """Return the stored hash for path, or None if it is not tracked"""
+        leaf_id = self.paths.find(_encode_path(path))
+        return bytes(self._digest(~leaf_id)) if leaf_id >= 0 else None
+
+    def get_tag(self, path):
+        """Return the tag stored for path, or None if it is not tracked"""
+        leaf_id = self.paths.find(_encode_path(path))
+        return self.leaf_tags[leaf_id] if leaf_id >= 0 else None
+
+    def set(self, path, file_hash, tag=0):
+        """Insert or modify a leaf, rehashing only the affected paths"""
+        if len(file_hash) != DIGEST_SIZE:
+            raise ValueError(f"Expected a {DIGEST_SIZE}-byte digest for {path}")
+
+        key = _encode_path(path)
+        leaf_id = self.paths.find(key)
+        if leaf_id >= 0:
+            self.leaf_tags[leaf_id] = tag
+            offset = leaf_id * DIGEST_SIZE
+            if self.leaf_digests[offset:offset + DIGEST_SIZE] == file_hash:
+                return
+            self.leaf_digests[offset:offset + DIGEST_SIZE] = file_hash
+            node = self.leaf_parent[leaf_id]
+            while node >= 0:
+                self._fix(node)
+                node = self.node_parent[node]
+            return
+
+        leaf_id = self._new_leaf(key, file_hash, tag)
+        left, right = self._split(self.root, key)
+        self._set_root(self._merge(self._merge(left, ~leaf_id), right))
+
+    def remove(self, path):
+        """Remove a leaf; returns False if the path was not tracked"""
+        key = _encode_path(path)
+        leaf_id = self.paths.find(key)
+        if leaf_id < 0:
+            return False
+        left, right = self._split(self.root, key)
+        self._set_root(self._merge(left, self._remove_min(right)))
+        self.paths.remove(leaf_id)
+        return True
+
+    def move_prefix(self, old_prefix, new_prefix):
+        """
+        Re-key every leaf under old_prefix to the same suffix under new_prefix,
+        keeping digests and tags; returns [(old_path, new_path, hash)].
+        The moved range keeps its relative order, so it is split out and
+        rebuilt in O(k + log n) rather than re-inserted leaf by leaf.
+        A leaf already tracked at a new path is kept over the moved one
+        (it was committed later); the pair is still listed so the caller
+        can re-verify it against the disk.
+        """
+        old_lo = _encode_path(old_prefix)
+        new_lo = _encode_path(new_prefix)
+        if old_lo == new_lo or self.root is None:
+            return []
+
+        # UTF-8 never produces 0xff, so lo + b'\xff' bounds every key starting with lo
+        left, rest = self._split(self.root, old_lo)
+        middle, right = self._split(rest, old_lo + b'\xff')
+        root = self._merge(left, right)
+        if middle is None:
+            self._set_root(root)
+            return []
+
+        moved = []
+        items = []
+        pending = [middle]
+        while pending:
+            ref = pending.pop()
+            if ref >= 0:
+                self.free_nodes.append(ref)
+                pending.append(self.node_right[ref])
+                pending.append(self.node_left[ref])
+                continue
+            leaf_id = ~ref
+            key = self.paths.key(leaf_id)
+            digest = bytes(self._digest(ref))
+            new_key = new_lo + key[len(old_lo):]
+            moved.append((_decode_path(key), _decode_path(new_key), digest))
+            items.append((new_key, digest, self.leaf_tags[leaf_id]))
+            self.paths.remove(leaf_id)
+
+        left, rest = self._split(root, new_lo)
+        existing, right = self._split(rest, new_lo + b'\xff')
+        if existing is not None:
+            # Destination already populated: insert leaf by leaf, never
+            # overwriting what is there
+            self._set_root(self._merge(left, self._merge(existing, right)))
+            for (_, new_path, digest), (_, _, tag) in zip(moved, items):
+                if new_path not in self:
+                    self.set(new_path, digest, tag)
+            return moved
+
+        self._set_root(self._merge(self._merge(left, self._build(items)), right))
+        return moved
+
+    def proof(self, path):
+        """
+        Return (siblings, index) for path, siblings ordered leaf to root.
+        Bit i of index is set when the node at step i is a right child, so
+        the usual `index % 2` / `index //= 2` verifier walks it unchanged.
+        """
+        leaf_id = self.paths.find(_encode_path(path))
+        if leaf_id < 0:
+            return None
+        siblings = []
+        index = 0
+        depth = 0
+        ref = ~leaf_id
+        parent = self.leaf_parent[leaf_id]
+        while parent >= 0:
+            if self.node_right[parent] == ref:
+                siblings.append(bytes(self._digest(self.node_left[parent])))
+                index |= 1 << depth
+            else:
+                siblings.append(bytes(self._digest(self.node_right[parent])))
+            ref = parent
+            parent = self.node_parent[parent]
+            depth += 1
+        return siblings, index
+
+    # Storage helpers
+    def _digest(self, ref):
+        if ref >= 0:
+            offset = ref * DIGEST_SIZE
+            return self.node_digests[offset:offset + DIGEST_SIZE]
+        offset = ~ref * DIGEST_SIZE
+        return self.leaf_digests[offset:offset + DIGEST_SIZE]
+
+    def _set_parent(self, ref, parent):
+        if ref >= 0:
+            self.node_parent[ref] = parent
+        else:
+            self.leaf_parent[~ref] = parent
+
+    def _set_root(self, ref):
+        self.root = ref
+        if ref is not None:
+            self._set_parent(ref, -1)
+
+    def _new_leaf(self, key, file_hash, tag=0):
+        leaf_id = self.paths.add(key)
+        if leaf_id == len(self.leaf_parent):
+            self.leaf_parent.append(-1)
+            self.leaf_tags.append(tag)
+            self.leaf_digests += file_hash
+        else:
+            self.leaf_parent[leaf_id] = -1
+            self.leaf_tags[leaf_id] = tag
+            offset = leaf_id * DIGEST_SIZE
+            self.leaf_digests[offset:offset + DIGEST_SIZE] = file_hash
+        return leaf_id
+
+    def _new_node(self, left, right, gap_leaf, priority):
+        """Allocate an internal node; the caller links it and calls _fix"""
+        if self.free_nodes:
+            node = self.free_nodes.pop()
+            self.node_left[node] = left
+            self.node_right[node] = right
+            self.node_parent[node] = -1
+            self.node_gap[node] = gap_leaf
+            self.node_priority[node] = priority
+        else:
+            node = len(self.node_left)
+            self.node_left.append(left)
+            self.node_right.append(right)
+            self.node_parent.append(-1)
+            self.node_gap.append(gap_leaf)
+            self.node_priority.append(priority)
+            self.node_digests += bytes(DIGEST_SIZE)
+        return node
+
+    def _fix(self, node):
+        """Re-link a node's children and recompute its digest"""
+        left = self.node_left[node]
+        right = self.node_right[node]
+        self._set_parent(left, node)
+        self._set_parent(right, node)
+        offset = node * DIGEST_SIZE
+        self.node_digests[offset:offset + DIGEST_SIZE] = hashlib.sha256(
+            self._digest(left) + self._digest(right)
+        ).digest()
+
+    def _beats(self, priority, gap_leaf, ref):
+        """Whether a gap (priority, gap_leaf) belongs above the subtree rooted at ref"""
+        if ref < 0:
+            return True
+        other = self.node_priority[ref]
+        if priority != other:
+            return priority > other
+        # 32-bit tie: fall back to path order so the shape stays deterministic
+        return self.paths.key(gap_leaf) > self.paths.key(self.node_gap[ref])
+
+    def _leftmost(self, ref):
+        while ref >= 0:
+            ref = self.node_left[ref]
+        return ~ref
+
+    # Treap operations
+    def _build(self, items):
+        """
+        Build a detached subtree in O(n) from (key bytes, hash, tag) sorted by
+        key and return its root ref (None if empty). Nodes leave the right
+        spine with final subtrees, so each is hashed exactly once.
+        """
+        root = None
+        stack = []  # internal nodes on the right spine, root first
+        for key, file_hash, tag in items:
+            leaf_id = self._new_leaf(key, file_hash, tag)
+            if root is None:
+                root = ~leaf_id
+                continue
+
+            priority = _priority(key, self.priority_key)
+            popped = None
+            while stack and self._beats(priority, leaf_id, stack[-1]):
+                popped = stack.pop()
+                self._fix(popped)
+            if popped is not None:
+                left = popped
+            else:
+                left = self.node_right[stack[-1]] if stack else root
+            node = self._new_node(left, ~leaf_id, leaf_id, priority)
+            if stack:
+                self.node_right[stack[-1]] = node
+            else:
+                root = node
+            stack.append(node)
+
+        while stack:
+            self._fix(stack.pop())
+        return root
+
+    def _split(self, ref, key):
+        """Split a subtree into (keys < key, keys >= key), reusing nodes"""
+        if ref is None:
+            return None, None
+        # Walk down to the leaf, then rebuild both halves bottom-up
+        path = []
+        while ref >= 0:
+            went_left = key <= self.paths.key(self.node_gap[ref])
+            path.append((ref, went_left))
+            ref = self.node_left[ref] if went_left else self.node_right[ref]
+        left, right = (ref, None) if self.paths.key(~ref) < key else (None, ref)
+
+        for node, went_left in reversed(path):
+            if went_left:
+                if left is None:
+                    right = node
+                elif right is None:
+                    self.free_nodes.append(node)
+                    right = self.node_right[node]
+                else:
+                    self.node_left[node] = right
+                    self._fix(node)
+                    right = node
+            else:
+                if right is None:
+                    left = node
+                elif left is None:
+                    self.free_nodes.append(node)
+                    left = self.node_left[node]
+                else:
+                    self.node_right[node] = left
+                    self._fix(node)
+                    left = node
+        return left, right
+
+    def _merge(self, left, right):
+        """Join two subtrees where every key of left sorts before right"""
+        if left is None:
+            return right
+        if right is None:
+            return left
+        gap_leaf = self._leftmost(right)
+        return self._merge_gap(left, right, gap_leaf, _priority(self.paths.key(gap_leaf), self.priority_key))
+
+    def _merge_gap(self, left, right, gap_leaf, priority):
+        """Merge across one gap: descend the inner spines until the gap wins, then relink upwards"""
+        path = []  # (node, True if its right child is replaced, else its left)
+        while True:
+            if self._beats(priority, gap_leaf, left) and self._beats(priority, gap_leaf, right):
+                node = self._new_node(left, right, gap_leaf, priority)
+                break
+            if right < 0 or (left >= 0 and self._beats(self.node_priority[left], self.node_gap[left], right)):
+                path.append((left, True))
+                left = self.node_right[left]
+            else:
+                path.append((right, False))
+                right = self.node_left[right]
+        self._fix(node)
+
+        for parent, on_right in reversed(path):
+            if on_right:
+                self.node_right[parent] = node
+            else:
+                self.node_left[parent] = node
+            self._fix(parent)
+            node = parent
+        return node
+
+    def _remove_min(self, ref):
+        """Drop the leftmost leaf of a subtree and the gap to its right"""
+        if ref is None or ref < 0:
+            return None
+        path = []
+        while self.node_left[ref] >= 0:
+            path.append(ref)
+            ref = self.node_left[ref]
+        self.free_nodes.append(ref)
+        subtree = self.node_right[ref]
+        for parent in reversed(path):
+            self.node_left[parent] = subtree
+            self._fix(parent)
+            subtree = parent
+        return subtree
+
+
+def build_merkle_tree(files, priority_key=None):
+    """
+    Build a Merkle tree from a list of (file_path, hash) tuples.
+    Returns (tree, files) where tree is a MerkleTree keyed with priority_key.
+    """
+    # Sort files by path for consistency
+    files.sort(key=lambda x: x[0])
+    return MerkleTree.from_sorted(files, priority_key), files
+
+
+def get_merkle_path(tree, file_path):
     """
     Get the Merkle path for a specific file.
     Returns dict with 'path', 'index', and 'root_hash'
     """
-    if not tree or not files:
+    if not tree:
         return None
-    
-    # Find the file index
-    file_index = -1
-    for i, (path, _) in enumerate(files):
-        if path == file_path:
-            file_index = i
-            break
-    
-    if file_index == -1:
+
+    proof = tree.proof(file_path)
+    if proof is None:
         return None
-    
-    merkle_path = []
-    current_index = file_index
-    
-    # Start from the bottom level (leaves)
-    for level_idx in range(len(tree) - 1, 0, -1):
-        level = tree[level_idx]
-        
-        # Determine if current node is left or right
-        is_left = current_index % 2 == 0
-        sibling_index = current_index + 1 if is_left else current_index - 1
-        
-        # Add sibling hash to path
-        if sibling_index < len(level):
-            merkle_path.append(level[sibling_index])
-        else:
-            # If no sibling, duplicate current node
-            merkle_path.append(level[current_index])
-        
-        # Move to parent level
-        current_index = current_index // 2
-    
+
+    merkle_path, index = proof
     return {
         'path': merkle_path,
-        'index': file_index,
-        'root_hash': tree[0][0]
-    }
\ No newline at end of file
+        'index': index,
+        'root_hash': tree.root_hash
+    }
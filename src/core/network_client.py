@@ -2,7 +2,8 @@
 """
 Network Client for communicating with the FIM Server
 """
-import requests
+import time
+import json
 from datetime import datetime
 
 class NetworkClient:
@@ -13,16 +14,16 @@ class NetworkClient:
         self.log_callback = log_callback
         self.state = state
         self.deregistered = False
+        self.batch_supported = None  # unknown until the first batch request
 
     def send_event_to_server(self, event_data):
         """Send event to server and get verification/rejection"""
         try:
-            response = requests.post(
-                f"{self.config.server_url}/api/events/report",
+            response = self.connection_mgr.http.post(
+                "/api/events/report",
                 headers=self.connection_mgr.get_auth_headers(),
                 json=event_data,
-                timeout=10,
-                verify=self.config.server_cert if self.config.server_cert else True
+                timeout=10
             )
             
             if response.status_code == 200:
@@ -42,65 +43,73 @@ class NetworkClient:
                     'accepted': data.get('accepted', True),
                     'recorded': data.get('recorded', True)
                 }
-            elif response.status_code == 400:
-                data = response.json()
-                
-                if not self._verify_server_response(data):
-                     return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
+            return self._failure_result(response)
+        except Exception as e:
+            self.config.logger.error(f"Failed to send event: {e}")
+            return {'success': False, 'rejected': False}
 
-                return {
-                    'success': False,
-                    'rejected': True,
-                    'reason': data.get('error', 'Unknown error')
-                }
-            elif response.status_code == 403:
-                data = response.json()
-                if not self._verify_server_response(data):
-                    return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
-                    
-                if data.get('status') == 'deregistered':
-                    self.deregistered = True
-                    self.log_callback({
-                        'type': 'deregistered',
-                        'message': data.get('message', 'This machine has been deregistered by the administrator.')
-                    })
-                    return {'success': False, 'rejected': True, 'reason': 'Client deregistered'}
+    def _failure_result(self, response):
+        """
+        Map a non-200 report response to a result: rejections (400, 401
+        for a removed machine, 403) carry rejected/reason and fire the
+        deregistration / removal callbacks; anything else is
+        {'success': False, 'rejected': False}, to be retried.
+        """
+        if response.status_code == 400:
+            data = response.json()
+            
+            if not self._verify_server_response(data):
+                 return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
+
+            return {
+                'success': False,
+                'rejected': True,
+                'reason': data.get('error', 'Unknown error')
+            }
+        elif response.status_code == 403:
+            data = response.json()
+            if not self._verify_server_response(data):
+                return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
                 
-                return {'success': False, 'rejected': True, 'reason': 'Forbidden'}
-            elif response.status_code == 401:
-                data = response.json()
-                if not self._verify_server_response(data):
-                     return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
+            if data.get('status') == 'deregistered':
+                self.deregistered = True
+                self.log_callback({
+                    'type': 'deregistered',
+                    'message': data.get('message', 'This machine has been deregistered by the administrator.')
+                })
+                return {'success': False, 'rejected': True, 'reason': 'Client deregistered'}
+            
+            return {'success': False, 'rejected': True, 'reason': 'Forbidden'}
+        elif response.status_code == 401:
+            data = response.json()
+            if not self._verify_server_response(data):
+                 return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
 
-                if "not registered" in data.get('error', '').lower():
-                    self.log_callback({'type': 'removal_detected'})
-                    return {'success': False, 'rejected': True, 'reason': 'Machine removed from server'}
-                return {'success': False, 'rejected': False}
-            else:
-                try:
-                    data = response.json()
-                    self._verify_server_response(data)
-                    error_msg = data.get('error', response.text)
-                except:
-                    error_msg = response.text
-                self.config.logger.error(f"Server error {response.status_code}: {error_msg}")
-                return {'success': False, 'rejected': False}
-        except Exception as e:
-            self.config.logger.error(f"Failed to send event: {e}")
+            if "not registered" in data.get('error', '').lower():
+                self.log_callback({'type': 'removal_detected'})
+                return {'success': False, 'rejected': True, 'reason': 'Machine removed from server'}
+            return {'success': False, 'rejected': False}
+        else:
+            try:
+                data = response.json()
+                self._verify_server_response(data)
+                error_msg = data.get('error', response.text)
+            except:
+                error_msg = response.text
+            self.config.logger.error(f"Server error {response.status_code}: {error_msg}")
             return {'success': False, 'rejected': False}
 
     def send_acknowledgement(self, event_id, validation):
         """Send acknowledgement that we received the validation"""
         try:
-            response = requests.post(
-                f"{self.config.server_url}/api/events/acknowledge",
+            response = self.connection_mgr.http.post(
+                "/api/events/acknowledge",
                 headers=self.connection_mgr.get_auth_headers(),
                 json={
                     'event_id': event_id,
                     'validation_received': validation
                 },
-                timeout=5,
-                verify=self.config.server_cert if self.config.server_cert else True
+                timeout=5
             )
             if response.status_code == 200:
                 data = response.json()
@@ -115,14 +124,92 @@ class NetworkClient:
         except:
             return False
 
+    def send_event_batch(self, events):
+        """
+        Report several events in one request. Returns {'success': True,
+        'results': [...]} with one result per event, in order (the fields
+        send_event_to_server returns, or rejected/reason), else a failure
+        mapped like send_event_to_server's: rejected/reason for a refused
+        request (and the deregistration / removal callbacks), or a
+        retryable {'success': False, 'rejected': False}. A server without
+        the batch endpoint (404/405) is remembered in batch_supported and
+        the result carries 'unsupported': True, so callers fall back to
+        single events.
+        """
+        try:
+            response = self.connection_mgr.http.post(
+                "/api/events/report_batch",
+                headers=self.connection_mgr.get_auth_headers(),
+                json={'events': events},
+                timeout=30
+            )
+            if response.status_code in (404, 405):
+                self.batch_supported = False
+                self.config.logger.info("Server has no batch report endpoint; sending events one at a time")
+                return {'success': False, 'rejected': False, 'unsupported': True}
+            if response.status_code != 200:
+                return self._failure_result(response)
+
+            data = response.json()
+            if not self._verify_server_response(data):
+                self.connection_mgr._last_security_error = time.time()
+                return {'success': False, 'rejected': True, 'reason': 'Security Error: Invalid Server Signature'}
+            results = data.get('results') or []
+            if len(results) != len(events):
+                self.config.logger.error(f"Batch report returned {len(results)} results for {len(events)} events")
+                return {'success': False, 'rejected': False}
+
+            self.batch_supported = True
+            self.connection_mgr.connected = True
+            self.connection_mgr.current_backoff = 1
+            self.log_callback({'type': 'status', 'connected': True})
+            return {
+                'success': True,
+                'results': [{
+                    'event_id': result.get('event_id'),
+                    'validation': result.get('validation'),
+                    'accepted': result.get('accepted', True),
+                    'recorded': result.get('recorded', True),
+                    'rejected': bool(result.get('error')),
+                    'reason': result.get('error')
+                } for result in results]
+            }
+        except Exception as e:
+            self.config.logger.error(f"Failed to send event batch: {e}")
+            return {'success': False, 'rejected': False}
+
+    def send_bulk_acknowledgement(self, acks):
+        """Acknowledge [(event_id, validation), ...] in one request; falls back to one ack each"""
+        if self.batch_supported is False:
+            return all(self.send_acknowledgement(event_id, validation) for event_id, validation in acks)
+        try:
+            response = self.connection_mgr.http.post(
+                "/api/events/acknowledge_batch",
+                headers=self.connection_mgr.get_auth_headers(),
+                json={'acks': [{'event_id': event_id, 'validation_received': validation}
+                               for event_id, validation in acks]},
+                timeout=10
+            )
+            if response.status_code in (404, 405):
+                return all(self.send_acknowledgement(event_id, validation) for event_id, validation in acks)
+            if response.status_code == 200:
+                data = response.json()
+                if not self._verify_server_response(data):
+                    self.connection_mgr._last_security_error = time.time()
+                    return False
+                return True
+            return False
+        except:
+            return False
+
     def send_heartbeat(self, root_hash, file_count, boot_id):
         """Send heartbeat to server"""
         if not self.connection_mgr.connected or self.deregistered:
             return False
         
         try:
-            response = requests.post(
-                f"{self.config.server_url}/api/clients/heartbeat",
+            response = self.connection_mgr.http.post(
+                "/api/clients/heartbeat",
                 headers=self.connection_mgr.get_auth_headers(),
                 json={
                     'tracked_file_count': file_count,
@@ -131,8 +218,7 @@ class NetworkClient:
                     'timestamp': datetime.now().isoformat(),
                     'expected_interval': 900
                 },
-                timeout=5,
-                verify=self.config.server_cert if self.config.server_cert else True
+                timeout=5
             )
             
             if response.status_code == 200:
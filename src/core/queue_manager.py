@@ -3,11 +3,17 @@
 Event Queue processing manager
 """
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
 class EventQueueManager:
-    def __init__(self, state, network_client, connection_mgr, log_callback):
+    def __init__(self, state, network_client, connection_mgr, log_callback, compact_threshold=None, batch_size=1,
+                 send_window=1):
         self.state = state
+        self.compact_threshold = compact_threshold
+        self.batch_size = batch_size
+        self.send_window = send_window
         self.network_client = network_client
         self.connection_mgr = connection_mgr
         self.log_callback = log_callback
@@ -44,7 +50,36 @@ class EventQueueManager:
         self.processing_queue = True
         
         try:
+            # MAC-only events at the end of a batch need its signature before the server can verify them
+            try:
+                self.state.flush_events()
+            except Exception as e:
+                self.log_to_gui(f"Could not close the open event batch: {str(e)}", "error")
+
+            # A backlog from an outage: collapse superseded same-path events first
+            if self.compact_threshold and self.state.get_queue_size() >= self.compact_threshold:
+                try:
+                    removed = self.state.compact_queue()
+                    if removed:
+                        self.log_to_gui(f"Compacted {removed} superseded events before sending", "info")
+                        self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
+                except Exception as e:
+                    self.log_to_gui(f"Queue compaction failed: {str(e)}", "error")
+
             while self.connection_mgr.connected and not self.deregistered:
+                # Batch mode: N events per request; anything it can't settle falls through to one event
+                if self.batch_size > 1 and self.network_client.batch_supported is not False:
+                    outcome = self._process_batch()
+                    if outcome == 'sent':
+                        continue
+                    if outcome == 'stop':
+                        break
+
+                # Windowed mode: up to send_window reports in flight, applied in queue order
+                if self.send_window > 1:
+                    self._process_window()
+                    break
+
                 event = self.state.peek_event()
                 if not event:
                     break
@@ -54,54 +89,9 @@ class EventQueueManager:
                     self.log_to_gui(f"⚠ SECURITY ALERT: Local signature verification failed for event {event.get('id')}. Reporting as WITNESS.", "warning")
 
                 try:
-                    result = self.network_client.send_event_to_server(event)
-                    
-                    if result['success']:
-                        # Update local state if the server actually accepted the integrity
-                        if result.get('accepted', True):
-                            ack_result = self.network_client.send_acknowledgement(
-                                result.get('event_id'), 
-                                result.get('validation')
-                            )
-                            if ack_result:
-                                self.state.update_last_valid_hash(
-                                    event.get('root_hash'),
-                                    result.get('validation')
-                                )
-                            else:
-                                self.log_to_gui("⚠ Acknowledgement failed, will retry", "warning")
-                                self.connection_mgr._last_security_error = time.time() # Backoff on ack failure too
-                                self.connection_mgr.mark_disconnected()
-                                break
-                        else:
-                            self.log_to_gui(f"⚠ Integrity Conflict recorded by server: {event.get('file_path', 'N/A')}", "warning")
-
-                        # If it was recorded (even if integrity was rejected), we pop and continue
-                        if result.get('recorded', True):
-                            self.state.dequeue_event()
-                            self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
-                            continue
-                            
-                    else:
-                        if self.network_client.deregistered:
-                            self.deregistered = True
-                            break
-                        
-                        if result.get('rejected'):
-                            self.log_to_gui(f"Event rejected: {result.get('reason')}", "error")
-                            
-                            if "Security Error" in result.get('reason', ''):
-                                self.connection_mgr._last_security_error = time.time()
-                                break
-
-                            # Dequeue and continue to allow subsequent events (audit trail)
-                            self.state.dequeue_event()
-                            self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
-                            continue
-                        else:
-                            self.log_to_gui("⚠ Connection lost, will retry", "warning")
-                            self.connection_mgr.mark_disconnected()
-                            break
+                    result, ack_result = self._send_and_acknowledge(event)
+                    if self._apply_result(event, result, ack_result) == 'stop':
+                        break
                             
                 except Exception as e:
                     import time
@@ -117,31 +107,232 @@ class EventQueueManager:
             if self.state.get_queue_size() > 0 and self.connection_mgr.connected and not self.deregistered:
                 threading.Thread(target=self.process_queue, daemon=True).start()
 
+    def _send_and_acknowledge(self, event):
+        """Report one event and, if the server accepted it, acknowledge the validation"""
+        result = self.network_client.send_event_to_server(event)
+        ack_result = None
+        if result['success'] and result.get('accepted', True):
+            ack_result = self.network_client.send_acknowledgement(
+                result.get('event_id'), 
+                result.get('validation')
+            )
+        return result, ack_result
+
+    def _apply_result(self, event, result, ack_result):
+        """
+        Apply the server's answer for the event at the head of the queue.
+        Returns 'next' (dequeued), 'retry' (not recorded; send it again)
+        or 'stop'.
+        """
+        import time
+        if result['success']:
+            # Update local state if the server actually accepted the integrity
+            if result.get('accepted', True):
+                if ack_result:
+                    self.state.update_last_valid_hash(
+                        event.get('root_hash'),
+                        result.get('validation')
+                    )
+                else:
+                    self.log_to_gui("⚠ Acknowledgement failed, will retry", "warning")
+                    self.connection_mgr._last_security_error = time.time() # Backoff on ack failure too
+                    self.connection_mgr.mark_disconnected()
+                    return 'stop'
+            else:
+                self.log_to_gui(f"⚠ Integrity Conflict recorded by server: {event.get('file_path', 'N/A')}", "warning")
+
+            # If it was recorded (even if integrity was rejected), we pop and continue
+            if result.get('recorded', True):
+                self.state.dequeue_event()
+                self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
+                return 'next'
+            return 'retry'
+
+        if self.network_client.deregistered:
+            self.deregistered = True
+            return 'stop'
+        
+        if result.get('rejected'):
+            self.log_to_gui(f"Event rejected: {result.get('reason')}", "error")
+            
+            if "Security Error" in result.get('reason', ''):
+                self.connection_mgr._last_security_error = time.time()
+                return 'stop'
+
+            # Dequeue and continue to allow subsequent events (audit trail)
+            self.state.dequeue_event()
+            self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
+            return 'next'
+
+        self.log_to_gui("⚠ Connection lost, will retry", "warning")
+        self.connection_mgr.mark_disconnected()
+        return 'stop'
+
+    def _process_window(self):
+        """
+        Sliding-window drain: keep up to send_window reports in flight on a
+        worker pool and settle their answers strictly in queue order. The
+        workers only send reports; acknowledgements, last_valid_hash and
+        dequeues happen here, for the run of answered reports at the head
+        of the window (one bulk ack), up to the first that failed. On a
+        failure the window is rewound: queued requests are cancelled,
+        running ones finish and are discarded, and their events stay
+        queued, unacknowledged, to be reported again (the server sees
+        those reports twice, as after a failed ack in the single path).
+        """
+        import time
+        pool = ThreadPoolExecutor(max_workers=self.send_window, thread_name_prefix='fim-sender')
+        inflight = deque()
+        try:
+            while self.connection_mgr.connected and not self.deregistered:
+                if len(inflight) < self.send_window:
+                    events = self.state.peek_events(self.send_window)
+                    if [e.get('id') for e in events[:len(inflight)]] != [e.get('id') for e, _ in inflight]:
+                        self.log_to_gui("Event queue changed under the send window; resending from the head", "warning")
+                        return
+                    for event in events[len(inflight):]:
+                        # Verify local signature (Witness Mode: Log warning but don't skip)
+                        if not self._verify_local_signature(event):
+                            self.log_to_gui(f"⚠ SECURITY ALERT: Local signature verification failed for event {event.get('id')}. Reporting as WITNESS.", "warning")
+                        inflight.append((event, pool.submit(self.network_client.send_event_to_server, event)))
+                if not inflight:
+                    return
+
+                # The head's answer, then every answer already in behind it, up to the first failure
+                try:
+                    answered = []
+                    for event, future in inflight:
+                        if answered and not future.done():
+                            break
+                        result = future.result()
+                        if not result['success']:
+                            if not answered:
+                                answered.append((event, result))
+                            break
+                        answered.append((event, result))
+                        if not result.get('recorded', True):
+                            break  # sent again after it is acknowledged
+                except Exception as e:
+                    self.log_to_gui(f"Error processing single event: {str(e)}", "error")
+                    time.sleep(2)
+                    return
+
+                event, result = answered[0]
+                if result.get('rejected'):
+                    if self._apply_result(event, result, None) == 'stop':
+                        return
+                    inflight.popleft()
+                    continue
+                if not result['success']:
+                    # Wait out the other sends first, so none reports the link up after it is marked down
+                    self._rewind(inflight)
+                    self._apply_result(event, result, None)
+                    return
+
+                acks = [(result.get('event_id'), result.get('validation'))
+                        for _, result in answered if result.get('accepted', True)]
+                if acks and not self.network_client.send_bulk_acknowledgement(acks):
+                    self._rewind(inflight)
+                    self.log_to_gui("⚠ Acknowledgement failed, will retry", "warning")
+                    self.connection_mgr._last_security_error = time.time() # Backoff on ack failure too
+                    self.connection_mgr.mark_disconnected()
+                    return
+                outcomes = [self._apply_result(event, result, True) for event, result in answered]
+                if outcomes[-1] == 'retry':
+                    # Rewind: everything behind the unrecorded event is sent again after it
+                    self._rewind(inflight)
+                    continue
+                for _ in answered:
+                    inflight.popleft()
+        finally:
+            self._rewind(inflight)
+            pool.shutdown(wait=True)
+
+    def _rewind(self, inflight):
+        """Cancel or wait out the in-flight sends; their events stay queued"""
+        for _, pending in inflight:
+            pending.cancel()
+        wait([pending for _, pending in inflight])
+        inflight.clear()
+
+    def _process_batch(self):
+        """
+        Send up to batch_size queued events in one request, bulk-acknowledge
+        the accepted ones and dequeue the settled prefix in one operation.
+        Returns 'sent', 'stop' (nothing queued, the request failed, or
+        stopped like the single path would) or 'single' (one event queued,
+        the server has no batch endpoint, or it refused the batch).
+        """
+        import time
+        events = self.state.peek_events(self.batch_size)
+        if not events:
+            return 'stop'
+        if len(events) == 1:
+            return 'single'
+
+        for event in events:
+            if not self._verify_local_signature(event):
+                self.log_to_gui(f"⚠ SECURITY ALERT: Local signature verification failed for event {event.get('id')}. Reporting as WITNESS.", "warning")
+
+        result = self.network_client.send_event_batch(events)
+        if not result['success']:
+            if result.get('unsupported'):
+                return 'single'
+            if self.network_client.deregistered:
+                self.deregistered = True
+                return 'stop'
+            if result.get('rejected'):
+                self.log_to_gui(f"Batch rejected: {result.get('reason')}", "error")
+                if "Security Error" in (result.get('reason') or ''):
+                    self.connection_mgr._last_security_error = time.time()
+                    return 'stop'
+                # The single path reports the head alone and settles it, so a bad event cannot block the queue
+                return 'single'
+            # Timeouts, 5xx and bad responses: retry the batch on the next drain
+            self.log_to_gui("⚠ Batch report failed, will retry", "warning")
+            self.connection_mgr.mark_disconnected()
+            return 'stop'
+
+        settled = 0
+        acks = []
+        last_valid = None
+        stop = False
+        for event, item in zip(events, result['results']):
+            if item['rejected']:
+                self.log_to_gui(f"Event rejected: {item.get('reason')}", "error")
+                if "Security Error" in (item.get('reason') or ''):
+                    self.connection_mgr._last_security_error = time.time()
+                    stop = True
+                    break
+                settled += 1
+                continue
+            if item.get('accepted', True):
+                acks.append((item.get('event_id'), item.get('validation')))
+                last_valid = (event.get('root_hash'), item.get('validation'))
+            else:
+                self.log_to_gui(f"⚠ Integrity Conflict recorded by server: {event.get('file_path', 'N/A')}", "warning")
+            if not item.get('recorded', True):
+                stop = True
+                break
+            settled += 1
+
+        if acks and not self.network_client.send_bulk_acknowledgement(acks):
+            self.log_to_gui("⚠ Acknowledgement failed, will retry", "warning")
+            self.connection_mgr._last_security_error = time.time() # Backoff on ack failure too
+            self.connection_mgr.mark_disconnected()
+            return 'stop'
+        if last_valid:
+            self.state.update_last_valid_hash(*last_valid)
+        if settled:
+            self.state.dequeue_events(settled)
+            self.log_callback({'type': 'pending', 'count': self.state.get_queue_size()})
+        return 'stop' if stop or not settled else 'sent'
+
     def _verify_local_signature(self, event):
-        """Verify the RSA signature of an event using the device's public key"""
+        """Verify the event's device signature (or MAC and batch signature) using the device's keys"""
         try:
             if not hasattr(self.state, 'device_signer') or not self.state.device_signer:
                 return True # Can't verify if no signer
-                
-            signature = event.get('signature')
-            if not signature:
-                return False
-                
-            payload_str = f"{event.get('id')}{event.get('prev_event_hash') or ''}{event.get('last_valid_hash') or ''}{event.get('new_hash') or ''}"
-            
-            from cryptography.hazmat.primitives.asymmetric import padding
-            from cryptography.hazmat.primitives import hashes
-            
-            sig_bytes = bytes.fromhex(signature)
-            self.state.device_signer.public_key.verify(
-                sig_bytes,
-                payload_str.encode('utf-8'),
-                padding.PSS(
-                    mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=32
-                ),
-                hashes.SHA256()
-            )
-            return True
+            return self.state.verify_event_seal(event)
         except Exception:
             return False
@@ -3,10 +3,11 @@
 Server connection management with exponential backoff
 """
 import time
-import requests
 import json
 from datetime import datetime
 
+from core.http_session import HTTPSessionManager
+
 
 class RegistrationClient:
     """Manages server connection with exponential backoff"""
@@ -22,6 +23,7 @@ class RegistrationClient:
         import logging
         self.logger = logging.getLogger(__name__)
         self._last_security_error = 0
+        self.http = HTTPSessionManager(config)
     
     def _log(self, msg, status="info"):
         if self.log_callback:
@@ -72,8 +74,8 @@ class RegistrationClient:
     def verify_registration(self):
         """Verify client registration and synchronize server public key"""
         try:
-            response = requests.post(
-                f"{self.config.server_url}/api/clients/verify",
+            response = self.http.post(
+                "/api/clients/verify",
                 headers=self.get_auth_headers(),
                 timeout=5
             )
@@ -103,17 +105,20 @@ class RegistrationClient:
         """Register with server and get JWT"""
         try:
             public_key = None
+            key_type = None
             if hasattr(self.state, 'device_signer') and self.state.device_signer:
                 public_key = self.state.device_signer.get_public_key_pem()
+                key_type = self.state.device_signer.key_type
                 
-            response = requests.post(
-                f"{self.config.server_url}/api/clients/register",
+            response = self.http.post(
+                "/api/clients/register",
                 json={
                     'client_id': self.config.host_id,
                     'hardware_info': getattr(self.config, 'hardware_info', {}),
                     'baseline_id': self.config.baseline_id,
                     'platform': self.config.platform_type,
-                    'public_key': public_key
+                    'public_key': public_key,
+                    'key_type': key_type
                 },
                 headers=self.get_auth_headers(),
                 timeout=10
@@ -150,12 +155,14 @@ class RegistrationClient:
         return False
     
     def mark_disconnected(self):
-        """Mark connection as lost and increase backoff"""
+        """Mark connection as lost, increase backoff and drop pooled connections"""
         self.connected = False
         self.current_backoff = min(self.current_backoff * 2, self.max_backoff)
+        self.http.reset()
     
     def reset(self):
         """Reset connection state"""
         self.connected = False
         self.current_backoff = 1
-        self.last_attempt = 0
\ No newline at end of file
+        self.last_attempt = 0
+        self.http.reset()
\ No newline at end of file
@@ -8,10 +8,18 @@ import threading
 import uuid
 import sys
 import hashlib
+import hmac
 import base64
+import queue
+import random
+import shutil
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from pathlib import Path
 import logging
+import multiprocessing
 
 try:
     import win32crypt
@@ -23,22 +31,166 @@ try:
 except ImportError:
     Fernet = None
 
-from core.crypto import DeviceSigner, ServerVerifier
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+except ImportError:
+    AESGCM = None
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from core.crypto import DeviceSigner, ServerVerifier, verify_device_signatures
+from core.event_log import EventLog
+from core.event_store import SQLiteEventStore, EVENT_DB_FILE
+from core.lock_timing import InstrumentedLock
+
+EVENT_LOG_DIR = 'event_log'
+COMPACTABLE_EVENTS = ('created', 'modified', 'deleted')
+QUEUE_CHECKPOINT_FILE = 'queue_checkpoint.json'
+VERIFY_CHUNK = 512  # signatures per process-pool task
+INTEGRITY_MODES = ('signature', 'batch')
+BATCH_CHECKPOINT = 'batch_checkpoint'  # event appended only to close an idle batch
+RECORD_MAGIC = b'FR1\x00'  # AES-GCM record: magic + 12-byte nonce + ciphertext and tag
+RECORD_KEY_FILE = 'record_key.bin'  # DPAPI-protected record key (Windows)
+HISTORY_INDEX_PURPOSE = b'fim-history-index'  # derive_key purpose for the event store's path tokens
+TAMPER_HASH_INTERVAL = 300  # mean seconds between full state.json rehashes in check_disk_tampering
+
+
+CHANGE_EVENTS = ('created', 'modified', 'moved', 'deleted')  # watchdog event types that can change a file
+
+
+def stat_fingerprint(st):
+    """(inode, size, mtime_ns, ctime_ns) of an os.stat result"""
+    return (st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def event_payload(event):
+    """The string an event's signature or MAC covers"""
+    return f"{event.get('id')}{event.get('prev_event_hash') or ''}{event.get('last_valid_hash') or ''}{event.get('new_hash') or ''}"
+
+
+def compute_event_hash(event):
+    """The chained event_hash of an event (over id, prev_event_hash, last_valid_hash, new_hash)"""
+    hasher = hashlib.sha256()
+    hasher.update(str(event.get('id', '')).encode())
+    hasher.update(str(event.get('prev_event_hash') or '').encode())
+    hasher.update(str(event.get('last_valid_hash') or '').encode())
+    hasher.update(str(event.get('new_hash') or '').encode())
+    return hasher.hexdigest()
+
+
+def batch_payload(event):
+    """The string a batch signature covers: the chain head at the closing event"""
+    return f"batch:{event.get('event_hash')}"
+
+
+class _ConfigFileHandler(FileSystemEventHandler):
+    """Calls on_change for any event touching the system config file"""
+
+    def __init__(self, config_path, on_change):
+        self.config_path = os.path.abspath(config_path)
+        self.on_change = on_change
+
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS:
+            return  # opened/closed: our own reads
+        paths = (event.src_path, getattr(event, 'dest_path', None))
+        if self.config_path in (os.path.abspath(p) for p in paths if p):
+            self.on_change()
 
 
 class FIMState:
     """Thread-safe persistent state manager"""
     
-    def __init__(self, state_file, logger=None):
-        """Initialize state manager and load persistent state from disk"""
+    def __init__(self, state_file, logger=None, commit_window=0.005, commit_batch=256, backend='log',
+                 memory_window=1024, verify_workers=None, key_type='rsa', integrity='signature',
+                 batch_events=256, batch_seconds=5.0, lock_observer=None):
+        """
+        Initialize state manager and load persistent state from disk.
+        commit_window/commit_batch bound how long and how many events
+        enqueued with wait=False are buffered before one group fsync.
+        backend selects the queue store: 'log' (EventLog segments) or
+        'sqlite' (SQLiteEventStore, which also keeps acknowledged history).
+        memory_window caps how many queued events the 'log' backend keeps
+        decoded in memory; the rest stay on disk until the queue drains.
+        verify_workers > 1 spreads a full queue validation's signature
+        checks over a process pool. Its workers are spawned, not forked
+        from this threaded process; entry points must call
+        multiprocessing.freeze_support() for frozen builds.
+        key_type ('rsa' or 'ed25519') is the device key algorithm used when
+        a new key pair is generated; existing keys keep their type.
+        integrity 'signature' signs every event with the device key;
+        'batch' gives each event a keyed MAC and signs the chain head once
+        per batch of batch_events events or batch_seconds seconds. A batch
+        left open (no further events) is closed by a signed
+        'batch_checkpoint' event after batch_seconds, on flush_events()
+        and before the queue is drained.
+        lock_observer(site, waited, held) is called after each outermost
+        release of self.lock (see core.lock_timing.LockStats).
+        """
         self.logger = logger or logging.getLogger(__name__)
         self.state_file = state_file
-        self.lock = threading.RLock()
+        self.lock = InstrumentedLock(lock_observer) if lock_observer else threading.RLock()
         self._last_disk_hash = None
+        self._disk_fingerprint = None
+        self._next_disk_rehash = 0
+        # system_config.json verification cache: (stat fingerprint, watch_directory)
+        self._config_cache = None
+        self._config_generation = 0
+        self._config_machine_key = None
+        self._config_observer = None
+        self._config_listeners = []
+        self.config_changed = threading.Event()
+        self._fernet = None
+        self._cipher = self._init_record_cipher()
         self.state = self._load_state()
         self.boot_id = uuid.uuid4().hex
         state_dir = os.path.dirname(state_file)
-        self.device_signer = DeviceSigner(state_dir)
+        self.queue_checkpoint_file = os.path.join(state_dir, QUEUE_CHECKPOINT_FILE)
+        self.verify_workers = verify_workers
+        if integrity not in INTEGRITY_MODES:
+            raise ValueError(f"Unsupported queue integrity mode: {integrity}")
+        self.integrity = integrity
+        self.batch_events = batch_events
+        self.batch_seconds = batch_seconds
+        self._batch_count = 0
+        self._batch_started = None
+        self._batch_timer = None
+        self._last_reserved = None
+        # Signing pipeline: events reserved under self.lock, sealed and appended in order by one thread
+        self._sign_queue = queue.Queue()
+        self._in_flight = 0
+        self._reserved_hash = None
+        self._pipeline_cond = threading.Condition()
+        self.device_signer = DeviceSigner(state_dir, key_type=key_type)
+        if self.device_signer.key_type != key_type:
+            self.logger.info(f"Device key is {self.device_signer.key_type}, not the configured {key_type}; "
+                             "remove the device key files and re-register to switch")
+        self.state['device_key_type'] = self.device_signer.key_type
+        self._event_mac_key = self.device_signer.derive_key(b'fim-event-chain')
+        if backend == 'sqlite':
+            self.event_log = SQLiteEventStore(os.path.join(state_dir, EVENT_DB_FILE),
+                                              self._encrypt, self._decrypt, logger=self.logger,
+                                              commit_window=commit_window, commit_batch=commit_batch,
+                                              index_key=self.device_signer.derive_key(HISTORY_INDEX_PURPOSE))
+            self._migrate_event_log(os.path.join(state_dir, EVENT_LOG_DIR))
+        else:
+            self.event_log = EventLog(os.path.join(state_dir, EVENT_LOG_DIR),
+                                      self._encrypt, self._decrypt, logger=self.logger,
+                                      commit_window=commit_window, commit_batch=commit_batch,
+                                      memory_window=memory_window)
+            if os.path.exists(os.path.join(state_dir, EVENT_DB_FILE)):
+                self.logger.warning(f"{EVENT_DB_FILE} is ignored by the 'log' queue backend; "
+                                    "events still pending in it are not sent")
+        self._migrate_event_queue()
+        self.state['last_event_id'] = max(self.state.get('last_event_id') or 0,
+                                          self.event_log.last_event_id)
+        threading.Thread(target=self._sign_worker, daemon=True, name='fim-event-signer').start()
         self.server_verifier = ServerVerifier()
         
         if self.state.get('server_public_key'):
@@ -48,13 +200,43 @@ class FIMState:
         self.queue_integrity_valid = self.validate_queue_integrity()
         if not self.queue_integrity_valid:
             self.logger.error("SECURITY ALERT: Local event queue integrity check failed! Queue may be tampered.")
+
+        # A batch left open by the previous run is closed like any idle one
+        tail = self.event_log.last()
+        if tail and tail.get('mac') and not tail.get('batch_signature'):
+            with self.lock:
+                self._last_reserved = tail
+                self._batch_count = 1
+                self._batch_started = time.monotonic()
+                self._arm_batch_timer()
     
+    @classmethod
+    def open_history(cls, state_file, logger=None):
+        """
+        Open the 'sqlite' backend's event store next to state_file read-only,
+        for history queries from tools: state.json is not loaded, no signer
+        thread is started and nothing is written. Returns None if there is
+        no event store or device key.
+        """
+        state_dir = os.path.dirname(state_file)
+        db_file = os.path.join(state_dir, EVENT_DB_FILE)
+        key_files = [os.path.join(state_dir, name) for name in ('device_private.pem', 'device_public.pem')]
+        if not os.path.exists(db_file) or not all(os.path.exists(path) for path in key_files):
+            return None
+        reader = cls.__new__(cls)
+        reader.state_file = state_file
+        reader._fernet = None
+        reader._cipher = reader._init_record_cipher()
+        return SQLiteEventStore(db_file, None, reader._decrypt, logger=logger, read_only=True,
+                                index_key=DeviceSigner(state_dir).derive_key(HISTORY_INDEX_PURPOSE))
+
     def _load_state(self):
         """Load state from disk or create default"""
         if os.path.exists(self.state_file):
             try:
                 with open(self.state_file, 'rb') as f:
                     data = f.read()
+                    self._disk_fingerprint = stat_fingerprint(os.fstat(f.fileno()))
                 
                 self._last_disk_hash = hashlib.sha256(data).hexdigest()
                 
@@ -70,11 +252,38 @@ class FIMState:
             'last_valid_hash': None,
             'last_server_validation': None,
             'last_event_id': 0,
-            'event_queue': [],
             'is_deregistered': False,
             'server_public_key': None
         }
     
+    def _migrate_event_queue(self):
+        """Move a queue stored inline in state.json (older clients) into the event log"""
+        legacy = self.state.pop('event_queue', None)
+        if legacy is None:
+            return
+        # Events already in the log were migrated by an interrupted earlier attempt
+        logged = set(event.get('id') for event in self.event_log)
+        for event in legacy:
+            if event.get('id') not in logged:
+                self.event_log.append(event)
+        self.event_log.sync()
+        if legacy:
+            self.logger.info(f"Migrated {len(legacy)} queued events to the event log")
+        self.save()
+
+    def _migrate_event_log(self, log_dir):
+        """Move events pending in the segment log into the SQLite store, then drop the log"""
+        if not os.path.isdir(log_dir):
+            return
+        old_log = EventLog(log_dir, self._encrypt, self._decrypt, logger=self.logger, commit_window=0)
+        # Events already in the store were copied by a run interrupted before the rmtree
+        moved = self.event_log.import_events(old_log)
+        self.event_log.last_event_id = max(self.event_log.last_event_id, old_log.last_event_id)
+        old_log.close()
+        shutil.rmtree(log_dir, ignore_errors=True)
+        if moved:
+            self.logger.info(f"Migrated {moved} queued events to {EVENT_DB_FILE}")
+
     def save(self):
         """Save state to disk (encrypted)"""
         try:
@@ -91,27 +300,49 @@ class FIMState:
                 
                 if sys.platform != 'win32':
                     os.chmod(self.state_file, 0o600)
+                self._disk_fingerprint = stat_fingerprint(os.stat(self.state_file))
         except Exception as e:
             print(f"Failed to save state: {e}")
 
     def check_disk_tampering(self):
-        """Check if state.json was modified externally"""
+        """
+        Check if state.json was modified externally. A stat fingerprint
+        (inode, size, mtime_ns, ctime_ns) is compared first; the file is
+        only reread and hashed when it differs, or on a randomised schedule
+        (about every TAMPER_HASH_INTERVAL seconds) in case the stat fields
+        were restored.
+        """
         if not self.state_file or not os.path.exists(self.state_file):
             return False
             
         with self.lock:
             try:
+                now = time.monotonic()
+                fingerprint = stat_fingerprint(os.stat(self.state_file))
+                if fingerprint == self._disk_fingerprint and now < self._next_disk_rehash:
+                    return False
+                self._next_disk_rehash = now + random.uniform(0.5, 1.5) * TAMPER_HASH_INTERVAL
                 with open(self.state_file, 'rb') as f:
                     raw_data = f.read()
+                    fingerprint = stat_fingerprint(os.fstat(f.fileno()))
                 current_hash = hashlib.sha256(raw_data).hexdigest()
                 if self._last_disk_hash and current_hash != self._last_disk_hash:
                     return True
+                # Same content (e.g. touched or copied back): trust the new stat fields
+                self._disk_fingerprint = fingerprint
             except:
                 pass
         return False
 
     def _encrypt(self, data):
-        """Encrypt data using Windows DPAPI or Linux Fernet"""
+        """
+        Encrypt one record (the state file or a queued event) with AES-GCM
+        under the cached record key. Without AESGCM, falls back to Windows
+        DPAPI or Linux Fernet for the whole blob.
+        """
+        if self._cipher:
+            nonce = os.urandom(12)
+            return RECORD_MAGIC + nonce + self._cipher.encrypt(nonce, data, None)
         if sys.platform == 'win32' and win32crypt:
             try:
                 # Use CRYPTPROTECT_LOCAL_MACHINE (4) so the state can be accessed 
@@ -121,14 +352,20 @@ class FIMState:
                 print(f"DPAPI Encryption failed: {e}")
         elif sys.platform != 'win32' and Fernet:
             try:
-                f = Fernet(self._get_machine_id_key())
-                return f.encrypt(data)
+                return self._legacy_fernet().encrypt(data)
             except Exception as e:
                 print(f"Linux Encryption failed: {e}")
         return data
 
     def _decrypt(self, data):
-        """Decrypt data using Windows DPAPI or Linux Fernet"""
+        """Decrypt an AES-GCM record, or a legacy DPAPI / Fernet blob"""
+        if data[:len(RECORD_MAGIC)] == RECORD_MAGIC:
+            try:
+                nonce = data[len(RECORD_MAGIC):len(RECORD_MAGIC) + 12]
+                return self._cipher.decrypt(nonce, data[len(RECORD_MAGIC) + 12:], None)
+            except (InvalidTag, AttributeError) as e:
+                print(f"Record decryption failed: {e or 'authentication tag mismatch'}")
+                return data
         if sys.platform == 'win32' and win32crypt:
             try:
                 # CryptUnprotectData(data, entropy, reserved, prompt_struct, flags)
@@ -144,12 +381,51 @@ class FIMState:
                 print(f"DPAPI Decryption failed: {e}")
         elif sys.platform != 'win32' and Fernet:
             try:
-                f = Fernet(self._get_machine_id_key())
-                return f.decrypt(data)
+                return self._legacy_fernet().decrypt(data)
             except Exception as e:
                 print(f"Linux Decryption failed: {e}")
         return data
 
+    def _init_record_cipher(self):
+        """
+        The AESGCM object for records, built once per process. On Windows
+        the key is random and kept DPAPI-protected in RECORD_KEY_FILE;
+        elsewhere it is derived from the machine id, like the Fernet key
+        it replaces.
+        """
+        if AESGCM is None:
+            return None
+        try:
+            if sys.platform == 'win32':
+                if not win32crypt:
+                    return None
+                key = self._load_dpapi_record_key()
+            else:
+                key = hashlib.sha256(b'fim-record-v1' + base64.urlsafe_b64decode(self._get_machine_id_key())).digest()
+            return AESGCM(key)
+        except Exception as e:
+            print(f"Record key setup failed: {e}")
+            return None
+
+    def _load_dpapi_record_key(self):
+        key_path = os.path.join(os.path.dirname(self.state_file), RECORD_KEY_FILE)
+        if os.path.exists(key_path):
+            with open(key_path, 'rb') as f:
+                _, key = win32crypt.CryptUnprotectData(f.read(), None, None, None, 4)
+            return key
+        key = AESGCM.generate_key(bit_length=256)
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        tmp_path = key_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(win32crypt.CryptProtectData(key, "FIM Record Key", None, None, None, 4))
+        os.replace(tmp_path, key_path)
+        return key
+
+    def _legacy_fernet(self):
+        if self._fernet is None:
+            self._fernet = Fernet(self._get_machine_id_key())
+        return self._fernet
+
     def _get_machine_id_key(self):
         """Derive a unique machine-bound key for Linux"""
         machine_id_paths = ['/etc/machine-id', '/var/lib/dbus/machine-id']
@@ -184,8 +460,30 @@ class FIMState:
         pass
         
     def get_watch_directory(self):
-        """Get the monitoring directory from system config with tamper protection"""
+        """
+        Get the monitoring directory from system config with tamper protection.
+        The verified result is cached: while watch_system_config() has a
+        watch on the file it is reused without any syscalls, otherwise only
+        while the file's stat fingerprint is unchanged.
+        """
+        cache = self._config_cache
+        if cache is not None and self._config_observer is not None:
+            return cache[1]
+        generation = self._config_generation
         sys_config_path = self._get_system_config_path()
+        try:
+            fingerprint = stat_fingerprint(os.stat(sys_config_path))
+        except OSError:
+            fingerprint = None
+        if cache is not None and cache[0] == fingerprint:
+            return cache[1]
+        watch_directory = self._read_watch_directory(sys_config_path) if fingerprint else None
+        if generation == self._config_generation:
+            self._config_cache = (fingerprint, watch_directory)
+        return watch_directory
+
+    def _read_watch_directory(self, sys_config_path):
+        """Read system_config.json and verify its signature"""
         if os.path.exists(sys_config_path):
             try:
                 with open(sys_config_path, 'r') as f:
@@ -214,6 +512,47 @@ class FIMState:
                 return None
         return None
 
+    def watch_system_config(self, listener=None):
+        """
+        Watch system_config.json for changes (inotify via watchdog on
+        Linux). Each change drops the cached verification, sets
+        config_changed and calls the registered listeners. Returns True if
+        the watch is active; without it get_watch_directory falls back to
+        a stat per call.
+        """
+        if listener:
+            self._config_listeners.append(listener)
+        with self.lock:
+            if self._config_observer is None and Observer is not None:
+                config_dir = os.path.dirname(self._get_system_config_path())
+                if os.path.isdir(config_dir):
+                    try:
+                        observer = Observer()
+                        observer.daemon = True
+                        observer.schedule(_ConfigFileHandler(self._get_system_config_path(), self._on_config_change),
+                                          config_dir, recursive=False)
+                        observer.start()
+                        self._config_cache = None
+                        self._config_observer = observer
+                    except Exception as e:
+                        self.logger.warning(f"Could not watch system config: {e}")
+        return self._config_observer is not None
+
+    def unwatch_system_config(self, listener):
+        """Remove a listener added by watch_system_config"""
+        if listener in self._config_listeners:
+            self._config_listeners.remove(listener)
+
+    def _on_config_change(self):
+        self._config_generation += 1
+        self._config_cache = None
+        self.config_changed.set()
+        for listener in list(self._config_listeners):
+            try:
+                listener()
+            except Exception as e:
+                self.logger.error(f"System config listener failed: {e}")
+
     def _generate_config_signature(self, data_str):
         """Generate a signature for the configuration string using the same logic as AdminDaemon"""
         import hashlib
@@ -248,9 +587,10 @@ class FIMState:
                 
             return hashlib.sha256(machine_id.encode()).digest()
 
-        machine_key = get_machine_key()
+        if self._config_machine_key is None:
+            self._config_machine_key = get_machine_key()
         hasher = hashlib.sha256()
-        hasher.update(machine_key)
+        hasher.update(self._config_machine_key)
         hasher.update(data_str.encode('utf-8'))
         return base64.b64encode(hasher.digest()).decode('utf-8')
     
@@ -267,15 +607,26 @@ class FIMState:
         return self.state.get('last_valid_hash')
     
     # Event queue operations
-    def enqueue_event(self, event):
-        """Add event to end of queue"""
+    def enqueue_event(self, event, wait=True, seal_batch=False):
+        """
+        Add event to end of queue. Only the id and chain position are
+        reserved under self.lock; the signing thread seals and appends
+        events in reservation order. With wait=True this returns once the
+        event is on disk (sharing the fsync with concurrent callers); with
+        wait=False it is group-committed later, or by flush_events().
+        Returns False if a waited-for event could not be written (the
+        error is logged), else True. seal_batch=True makes the event close
+        the open batch (see close_batch).
+        """
+        appended = Future() if wait else None
         with self.lock:
             event['queued_at'] = datetime.now().isoformat()
             
             if event.get('last_valid_hash') is None:
                 event['last_valid_hash'] = self.get_last_valid_hash()
  
-            # Assign and increment monotonic event ID
+            # Assign and increment monotonic event ID. The counter is not
+            # saved here: on restart it is recovered from the event log.
             if 'last_event_id' not in self.state:
                 self.state['last_event_id'] = 0
                 
@@ -287,108 +638,493 @@ class FIMState:
                 # For now, if no ID is passed, we use the counter.
                 pass
  
-            # Determine prev_event_hash for the chain
-            prev_event_hash = None
-            if self.state['event_queue']:
-                prev_event_hash = self.state['event_queue'][-1].get('event_hash')
+            # Determine prev_event_hash for the chain: the last reserved
+            # event while any are in flight, else the queue tail
+            with self._pipeline_cond:
+                if self._in_flight:
+                    prev_event_hash = self._reserved_hash
+                else:
+                    tail = self.event_log.last()
+                    prev_event_hash = tail.get('event_hash') if tail else self.get_last_valid_hash()
+                self._link_event(event, prev_event_hash)
+                self._reserved_hash = event['event_hash']
+                self._in_flight += 1
+            self._last_reserved = event
+            self._sign_queue.put((event, seal_batch or self._batch_due(), appended))
+        if wait:
+            try:
+                self.event_log.sync(appended.result())
+            except Exception as e:
+                self.logger.error(f"Event {event.get('id')} was not written: {e}")
+                return False
+        return True
+
+    def _sign_worker(self):
+        """
+        Pipeline stage: seal reserved events and append them in chain order.
+        If an event cannot be appended, the events reserved behind it are
+        relinked onto its predecessor so the chain never references it.
+        """
+        relinked = {}  # event_hash of a dropped or relinked event -> hash its successor chains to
+        while True:
+            event, close_batch, appended = self._sign_queue.get()
+            try:
+                prev_event_hash = event.get('prev_event_hash')
+                if prev_event_hash in relinked:
+                    self._relink_reserved(event, relinked[prev_event_hash], relinked)
+                self._sign_event(event, close_batch)
+                ticket = self.event_log.append(event)
+            except Exception as e:
+                self.logger.error(f"Failed to queue event {event.get('id')}: {e}")
+                if self.event_log.last() is not event:
+                    # Dropped: successors (and new reservations) chain to its predecessor
+                    dropped, prev_event_hash = event.get('event_hash'), event.get('prev_event_hash')
+                    for stale_hash, target in relinked.items():
+                        if target == dropped:
+                            relinked[stale_hash] = prev_event_hash
+                    relinked[dropped] = prev_event_hash
+                    with self._pipeline_cond:
+                        if self._reserved_hash == dropped:
+                            self._reserved_hash = prev_event_hash
+                if appended:
+                    appended.set_exception(e)
             else:
-                prev_event_hash = self.get_last_valid_hash()
-                
-            event['prev_event_hash'] = prev_event_hash
-            
-            # Calculate new event_hash
-            hasher = hashlib.sha256()
-            hasher.update(str(event.get('id', '')).encode())
-            hasher.update(str(event.get('prev_event_hash') or '').encode())
-            hasher.update(str(event.get('last_valid_hash') or '').encode())
-            hasher.update(str(event.get('new_hash') or '').encode())
-            event['event_hash'] = hasher.hexdigest()
-            
-            if hasattr(self, 'device_signer') and self.device_signer:
-                payload_str = f"{event.get('id')}{event.get('prev_event_hash') or ''}{event.get('last_valid_hash') or ''}{event.get('new_hash') or ''}"
+                if appended:
+                    appended.set_result(ticket)
+            finally:
+                with self._pipeline_cond:
+                    self._in_flight -= 1
+                    if not self._in_flight:
+                        relinked.clear()
+                    self._pipeline_cond.notify_all()
+
+    def _relink_reserved(self, event, prev_event_hash, relinked):
+        """Move a reserved event onto prev_event_hash after an earlier event was dropped"""
+        stale_hash = event.get('event_hash')
+        self._link_event(event, prev_event_hash)
+        relinked[stale_hash] = event['event_hash']
+        with self._pipeline_cond:
+            if self._reserved_hash == stale_hash:
+                self._reserved_hash = event['event_hash']
+
+    def _drain_pipeline(self):
+        """Wait until every reserved event has been appended to the event log"""
+        with self._pipeline_cond:
+            self._pipeline_cond.wait_for(lambda: not self._in_flight)
+
+    def _seal_event(self, event, prev_event_hash, close_batch=False):
+        """Link event into the hash chain after prev_event_hash and sign it"""
+        self._link_event(event, prev_event_hash)
+        self._sign_event(event, close_batch)
+
+    def _link_event(self, event, prev_event_hash):
+        event['prev_event_hash'] = prev_event_hash
+        event['event_hash'] = compute_event_hash(event)
+
+    def _sign_event(self, event, close_batch=False):
+        """
+        Seal a linked event: a device signature ('signature' mode), or a
+        keyed MAC plus, on the event closing a batch, a device signature
+        over the chain head.
+        """
+        if hasattr(self, 'device_signer') and self.device_signer:
+            payload_str = event_payload(event)
+            if self.integrity == 'batch':
+                event.pop('signature', None)
+                event['mac'] = self._event_mac(payload_str)
+                if close_batch:
+                    event['batch_signature'] = self.device_signer.sign_payload(batch_payload(event))
+                else:
+                    event.pop('batch_signature', None)
+            else:
+                event.pop('mac', None)
+                event.pop('batch_signature', None)
                 event['signature'] = self.device_signer.sign_payload(payload_str)
-            
-            self.state['event_queue'].append(event)
-            self.save()
+
+    def _batch_due(self):
+        """Count an event into the open batch; True if it closes the batch"""
+        if self.integrity != 'batch':
+            return False
+        now = time.monotonic()
+        if self._batch_started is None:
+            self._batch_started = now
+        self._batch_count += 1
+        if self._batch_count >= self.batch_events or now - self._batch_started >= self.batch_seconds:
+            self._batch_count = 0
+            self._batch_started = None
+            return True
+        self._arm_batch_timer()
+        return False
+
+    def close_batch(self, wait=False):
+        """
+        Close the open batch now by queueing a signed 'batch_checkpoint'
+        event. Until a batch closes its events carry only a local MAC, which
+        the server cannot verify. Returns True if a checkpoint was queued.
+        """
+        with self.lock:
+            if not self._batch_count:
+                return False
+            self._batch_count = 0
+            self._batch_started = None
+            previous = self._last_reserved or {}
+            checkpoint = {
+                'event_type': BATCH_CHECKPOINT,
+                'file_path': None,
+                'old_hash': None,
+                'new_hash': None,
+                # Acknowledging it must not move last_valid_hash off the current tree
+                'root_hash': previous.get('root_hash'),
+                'merkle_proof': None,
+                'timestamp': datetime.now().isoformat()
+            }
+            if previous.get('client_id'):
+                checkpoint['client_id'] = previous['client_id']
+        return self.enqueue_event(checkpoint, wait=wait, seal_batch=True)
+
+    def _arm_batch_timer(self):
+        """Make sure an idle open batch is closed batch_seconds after it opened (caller holds self.lock)"""
+        if self._batch_timer is not None or self._batch_started is None:
+            return
+        delay = max(0.0, self._batch_started + self.batch_seconds - time.monotonic())
+        self._batch_timer = threading.Timer(delay, self._batch_timer_fired)
+        self._batch_timer.daemon = True
+        self._batch_timer.start()
+
+    def _batch_timer_fired(self):
+        with self.lock:
+            self._batch_timer = None
+            if self._batch_started is None:
+                return
+            if time.monotonic() - self._batch_started < self.batch_seconds:
+                self._arm_batch_timer()  # a newer batch opened since
+                return
+        try:
+            self.close_batch()
+        except Exception as e:
+            self.logger.error(f"Could not close the open event batch: {e}")
+
+    def _event_mac(self, payload_str):
+        return hmac.new(self._event_mac_key, payload_str.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def verify_event_seal(self, event):
+        """Check an event's signature, or its MAC and (if it closes a batch) the batch signature"""
+        payload_str = event_payload(event)
+        if event.get('signature'):
+            return self.device_signer.verify_payload(payload_str, event['signature'])
+        if not event.get('mac') or not hmac.compare_digest(self._event_mac(payload_str), str(event['mac'])):
+            return False
+        if event.get('batch_signature'):
+            return event.get('event_hash') == compute_event_hash(event) and \
+                self.device_signer.verify_payload(batch_payload(event), event['batch_signature'])
+        return True
+
+    def compact_queue(self):
+        """
+        Collapse queued created/modified/deleted events for the same path into
+        one event: the last one (its root hash and proof are the most recent),
+        carrying the first old_hash and a compacted_count. Any other event
+        type (moves, tamper reports) is a barrier that runs do not cross.
+        Events after the first dropped one are re-linked and re-signed so
+        the queue still passes validate_queue_integrity, so every event's
+        chain link, hash and seal are checked first: a queue that failed
+        its integrity check, or fails these, is left as it is. Returns the
+        number of events removed.
+        """
+        with self.lock:
+            self._drain_pipeline()
+            if not self.queue_integrity_valid:
+                self.logger.error("Not compacting the event queue: it failed its integrity check")
+                return 0
+            # Pass 1: per (barrier epoch, path), the last position plus a summary
+            runs = {}
+            compactable = 0
+            prev_event_hash = None
+            for i, key, event in self._compaction_keys():
+                problem = self._reseal_problem(event, prev_event_hash if i else None)
+                if problem:
+                    self.logger.error(f"Queue Error: {problem} at event {event.get('id')}; not compacting")
+                    self.queue_integrity_valid = False
+                    return 0
+                prev_event_hash = event.get('event_hash')
+                if key is None:
+                    continue
+                compactable += 1
+                run = runs.get(key)
+                if run is None:
+                    runs[key] = {
+                        'last': i,
+                        'count': event.get('compacted_count', 1),
+                        'old_hash': event.get('old_hash'),
+                        'first_timestamp': event.get('first_timestamp') or event.get('timestamp'),
+                        'created': event.get('event_type') == 'created'
+                    }
+                else:
+                    run['last'] = i
+                    run['count'] += event.get('compacted_count', 1)
+            if len(runs) == compactable:
+                return 0
+            runs = {run['last']: run for run in runs.values()}
+            before = len(self.event_log)
+
+            # Pass 2: stream the survivors into a rewritten queue
+            def compacted():
+                prev_event_hash = original_prev = None
+                dirty = False
+                close_batch = False
+                for i, key, event in self._compaction_keys():
+                    if i == 0:
+                        prev_event_hash = event.get('prev_event_hash')
+                    # Re-read from the store: check again what is about to be re-signed
+                    problem = self._reseal_problem(event, original_prev if i else None) if dirty else None
+                    if problem:
+                        raise ValueError(f"{problem} at event {event.get('id')}")
+                    original_prev = event.get('event_hash')
+                    if key is not None and i not in runs:
+                        dirty = True
+                        # A dropped batch closer hands its signature to the next survivor
+                        close_batch = close_batch or 'batch_signature' in event
+                        continue
+                    run = runs.get(i)
+                    if run and run['count'] > event.get('compacted_count', 1):
+                        event = dict(event)
+                        event['old_hash'] = run['old_hash']
+                        event['compacted_count'] = run['count']
+                        event['first_timestamp'] = run['first_timestamp']
+                        if event['event_type'] != 'deleted':
+                            event['event_type'] = 'created' if run['created'] else 'modified'
+                    if dirty:
+                        event = dict(event)
+                        self._seal_event(event, prev_event_hash, close_batch=close_batch or
+                                         'batch_signature' in event or 'signature' in event)
+                        close_batch = False
+                    prev_event_hash = event.get('event_hash')
+                    yield event
+
+            try:
+                self.event_log.rewrite(compacted())
+            except ValueError as e:
+                self.logger.error(f"Queue Error: {e}; compaction abandoned")
+                self.queue_integrity_valid = False
+                return 0
+            self._save_queue_checkpoint()
+            removed = before - len(self.event_log)
+            self.logger.info(f"Compacted event queue: {before} -> {before - removed} events")
+            return removed
+
+    def _reseal_problem(self, event, prev_event_hash):
+        """Why compact_queue must not re-sign event (linked after prev_event_hash unless None), else None"""
+        if prev_event_hash is not None and event.get('prev_event_hash') != prev_event_hash:
+            return "hash chain break"
+        if compute_event_hash(event) != event.get('event_hash'):
+            return "event hash mismatch"
+        if not self.verify_event_seal(event):
+            return "signature verification failed"
+        return None
+
+    def _compaction_keys(self):
+        """Yield (index, (epoch, path) or None, event) over the queue"""
+        epoch = 0
+        for i, event in enumerate(self.event_log):
+            if event.get('event_type') in COMPACTABLE_EVENTS and event.get('file_path'):
+                yield i, (epoch, event['file_path']), event
+            else:
+                epoch += 1
+                yield i, None, event
+
+    def flush_events(self, seal_batch=True):
+        """
+        Make every enqueued event durable and move the validation checkpoint
+        up to them. Closes the open batch first unless seal_batch=False.
+        """
+        if seal_batch:
+            self.close_batch()
+        self._drain_pipeline()
+        self.event_log.sync()
+        self._save_queue_checkpoint()
     
     def peek_event(self):
         """Get first event without removing"""
         with self.lock:
-            if self.state['event_queue']:
-                return self.state['event_queue'][0]
-            return None
+            return self.event_log.peek()
     
     def dequeue_event(self):
         """Remove first event from queue"""
         with self.lock:
-            if self.state['event_queue']:
-                event = self.state['event_queue'].pop(0)
-                self.save()
-                return event
-            return None
+            return self.event_log.pop()
+
+    def peek_events(self, count):
+        """Get up to count events from the front of the queue without removing them"""
+        with self.lock:
+            return self.event_log.peek_many(count)
+
+    def dequeue_events(self, count):
+        """Remove up to count events from the front of the queue with one persistence operation"""
+        with self.lock:
+            return self.event_log.pop_many(count)
     
     def get_queue_size(self):
-        """Get current queue size"""
+        """Get current queue size, including events still in the signing pipeline"""
         with self.lock:
-            return len(self.state['event_queue'])
+            return len(self.event_log) + self._in_flight
 
-    def validate_queue_integrity(self):
-        """Iterate through the event queue and verify signatures and hash chain"""
+    def query_history(self, path_prefix=None, since=None, until=None, limit=None):
+        """Search queued and acknowledged events (needs the 'sqlite' backend)"""
+        if not hasattr(self.event_log, 'history'):
+            self.logger.warning("Event history is only kept by the 'sqlite' queue backend")
+            return []
+        return self.event_log.history(path_prefix=path_prefix, since=since, until=until, limit=limit)
+
+    def validate_queue_integrity(self, full=False):
+        """
+        Iterate through the event queue and verify signatures and hash chain.
+        Hashes and links are always rechecked; signatures are only verified
+        for events after the MAC'd checkpoint of the last validated event,
+        unless full=True or the checkpoint does not match the queue.
+        """
         with self.lock:
-            queue = self.state.get('event_queue', [])
-            if not queue:
+            self._drain_pipeline()
+            corrupt = getattr(self.event_log, 'corrupt', None)
+            if corrupt:
+                self.logger.error(f"Queue Error: {len(corrupt)} corrupt record(s) in the event log, "
+                                  f"first at segment {corrupt[0][0]} offset {corrupt[0][1]}")
+                return False
+            if not len(self.event_log):
                 return True
-                
-            prev_hash = self.get_last_valid_hash()
-            
-            for event in queue:
+
+            checkpoint = None if full else self._load_queue_checkpoint()
+            valid = self._validate_events(checkpoint)
+            if valid is None:
+                self.logger.warning("Queue checkpoint does not match the queue; running full validation")
+                valid = self._validate_events(None)
+            if valid:
+                self._save_queue_checkpoint(validated=True)
+            return valid
+
+    def _validate_events(self, checkpoint):
+        """True/False for the queue, or None if the checkpoint is not in it"""
+        prev_hash = self.get_last_valid_hash()
+        verify = hasattr(self, 'device_signer') and self.device_signer
+        pool = None
+        if verify and (self.verify_workers or 0) > 1 and not checkpoint and len(self.event_log) >= VERIFY_CHUNK:
+            pool = ProcessPoolExecutor(max_workers=self.verify_workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+            public_pem = self.device_signer.get_public_key_pem()
+        chunk, jobs = [], []
+        trusted = checkpoint is not None
+        skipped = 0
+        try:
+            for event in self.event_log:
                 # 1. Verify Hash Chain
                 if event.get('prev_event_hash') != prev_hash:
                     self.logger.error(f"Queue Error: Hash chain break at event {event.get('id')}")
                     return False
                 
                 # 2. Recompute and verify event_hash
-                hasher = hashlib.sha256()
-                hasher.update(str(event.get('id', '')).encode())
-                hasher.update(str(event.get('prev_event_hash') or '').encode())
-                hasher.update(str(event.get('last_valid_hash') or '').encode())
-                hasher.update(str(event.get('new_hash') or '').encode())
-                recomputed_hash = hasher.hexdigest()
+                recomputed_hash = compute_event_hash(event)
                 
                 if recomputed_hash != event.get('event_hash'):
                     self.logger.error(f"Queue Error: Event hash mismatch at event {event.get('id')}")
                     return False
-                
-                # 3. Verify RSA Signature (if signer available)
-                if hasattr(self, 'device_signer') and self.device_signer:
-                    payload_str = f"{event.get('id')}{event.get('prev_event_hash') or ''}{event.get('last_valid_hash') or ''}{event.get('new_hash') or ''}"
+                prev_hash = event.get('event_hash')
+
+                # Events up to the checkpoint are covered by its chained hash
+                if trusted:
+                    event_id = event.get('id')
+                    if event_id == checkpoint['event_id']:
+                        if event.get('event_hash') != checkpoint['event_hash']:
+                            return None
+                        trusted = False
+                        continue
+                    if isinstance(event_id, int) and isinstance(checkpoint['event_id'], int) \
+                            and event_id < checkpoint['event_id']:
+                        skipped += 1
+                        continue
+                    if skipped:
+                        return None
+                    trusted = False  # checkpointed event already dequeued
+
+                # 3. Verify Signature or MAC (if signer available)
+                if verify:
                     signature = event.get('signature')
                     
-                    if not signature:
+                    if not signature and not event.get('mac'):
                         self.logger.error(f"Queue Error: Missing signature at event {event.get('id')}")
                         return False
-                        
-                    try:
-                        from cryptography.hazmat.primitives.asymmetric import padding
-                        from cryptography.hazmat.primitives import hashes
-                        
-                        sig_bytes = bytes.fromhex(signature)
-                        self.device_signer.public_key.verify(
-                            sig_bytes,
-                            payload_str.encode('utf-8'),
-                            padding.PSS(
-                                mgf=padding.MGF1(hashes.SHA256()),
-                                salt_length=32
-                            ),
-                            hashes.SHA256()
-                        )
-                    except Exception as e:
-                        self.logger.error(f"Queue Error: Signature verification failed at event {event.get('id')}: {e}")
-                        return False
-                
-                prev_hash = event.get('event_hash')
-                
+
+                    if pool is None or not signature:
+                        if not self.verify_event_seal(event):
+                            self.logger.error(f"Queue Error: Signature verification failed at event {event.get('id')}")
+                            return False
+                        continue
+                    chunk.append((event.get('id'), event_payload(event), signature))
+                    if len(chunk) >= VERIFY_CHUNK:
+                        jobs.append((chunk, pool.submit(verify_device_signatures, public_pem,
+                                                        [item[1:] for item in chunk])))
+                        chunk = []
+
+            if trusted:
+                return None
+            if chunk:
+                jobs.append((chunk, pool.submit(verify_device_signatures, public_pem,
+                                                [item[1:] for item in chunk])))
+            for items, job in jobs:
+                try:
+                    bad = job.result()
+                except BrokenProcessPool as e:
+                    self.logger.warning(f"Verification workers failed ({e}); verifying in-process")
+                    bad = verify_device_signatures(public_pem, [item[1:] for item in items])
+                if bad >= 0:
+                    self.logger.error(f"Queue Error: Signature verification failed at event {items[bad][0]}")
+                    return False
             return True
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+
+    def _queue_checkpoint_mac(self, event_id, event_hash):
+        key = self.device_signer.derive_key(b'fim-queue-checkpoint')
+        return hmac.new(key, f"{event_id}:{event_hash}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def _load_queue_checkpoint(self):
+        """The MAC-verified checkpoint, or None"""
+        try:
+            with open(self.queue_checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+            mac = self._queue_checkpoint_mac(checkpoint['event_id'], checkpoint['event_hash'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Queue checkpoint unreadable: {e}")
+            return None
+        if not hmac.compare_digest(mac, str(checkpoint.get('mac'))):
+            self.logger.error("SECURITY ALERT: Queue checkpoint MAC mismatch; ignoring it")
+            return None
+        return checkpoint
+
+    def _save_queue_checkpoint(self, validated=False):
+        """
+        Record the queue tail as validated: events this process signed are
+        trusted, but only on top of a queue that passed validation.
+        """
+        if not validated and not getattr(self, 'queue_integrity_valid', False):
+            return
+        with self.lock:
+            tail = self.event_log.last()
+            if not tail or not tail.get('event_hash'):
+                return
+            checkpoint = {
+                'event_id': tail.get('id'),
+                'event_hash': tail['event_hash'],
+                'mac': self._queue_checkpoint_mac(tail.get('id'), tail['event_hash'])
+            }
+        try:
+            tmp_path = self.queue_checkpoint_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, self.queue_checkpoint_file)
+        except OSError as e:
+            self.logger.warning(f"Could not save queue checkpoint: {e}")
  
     def set_deregistered(self, status):
         """Set the deregistered flag"""
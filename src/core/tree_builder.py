@@ -3,36 +3,156 @@
 Merkle tree builder for initial directory scanning
 """
 import os
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
 from core.merkle import build_merkle_tree
-from core.utils import sha256_file
+from core.utils import sha256_file, stat_tag
+
+PROGRESS_INTERVAL = 2.0  # seconds between scan progress messages
+
 
+def default_scan_workers():
+    """Hash worker threads used when none are configured (hashlib releases the GIL)"""
+    return min(32, (os.cpu_count() or 1) + 4)
 
-def build_initial_tree(directory, logger=None):
+
+def iter_files(directory):
+    """
+    Yield every file path under directory using os.scandir.
+    Matches os.walk(directory): symlinked directories are listed but not
+    followed, and unreadable directories are skipped.
+    """
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        yield entry.path
+                    elif not entry.is_symlink():
+                        pending.append(entry.path)
+        except OSError:
+            continue
+
+
+class ScanProgress:
+    """Thread-safe counter that reports scan progress through log_callback"""
+
+    def __init__(self, directory, log_callback=None, interval=PROGRESS_INTERVAL):
+        self.directory = directory
+        self.log_callback = log_callback
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.hashed = 0
+        self.cached = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def record(self, ok, cached=False):
+        with self.lock:
+            if cached:
+                self.cached += 1
+            elif ok:
+                self.hashed += 1
+            else:
+                self.failed += 1
+            now = time.monotonic()
+            if now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            elapsed = now - self.started
+            message = (f"Scanning {self.directory}: {self.hashed} files hashed, "
+                       f"{self.cached} unchanged ({(self.hashed + self.cached) / elapsed:.0f} files/s)")
+        self._log(message)
+
+    def finish(self):
+        elapsed = time.monotonic() - self.started
+        self._log(f"Initial scan complete: {self.hashed} files hashed, {self.cached} unchanged "
+                  f"in {elapsed:.1f}s", "success")
+
+    def _log(self, message, status="info"):
+        if self.log_callback:
+            self.log_callback({
+                'type': 'log',
+                'timestamp': datetime.now().isoformat(),
+                'message': message,
+                'status': status
+            })
+
+
+def build_initial_tree(directory, logger=None, log_callback=None, workers=None, cache=None, priority_key=None):
     """
     Build initial Merkle tree from directory contents
-    
+
     Args:
         directory: Path to directory to scan
         logger: Optional logger for warnings
-        
+        log_callback: Optional callable(msg: dict) receiving scan progress
+        workers: Number of hash worker threads (default: default_scan_workers())
+        cache: Optional HashCache; files with an unchanged stat fingerprint reuse
+               their cached digest instead of being reread, and the cache is
+               saved with this scan's entries afterwards
+        priority_key: Per-device secret keying the tree shape (see merkle.MerkleTree)
+
     Returns:
-        tuple: (tree, files) where tree is the merkle tree and files is list of (path, hash) tuples
+        tuple: (tree, files) where tree is the merkle tree and files is list of
+               (path, hash, tag) tuples, tag being utils.stat_tag of the file
     """
     files = []
     inaccessible_files = []
-    
-    for root, _, filenames in os.walk(directory):
-        for fname in filenames:
-            path = os.path.join(root, fname)
-            h = sha256_file(path)
+    workers = workers or default_scan_workers()
+    progress = ScanProgress(directory, log_callback)
+
+    # Bound the number of queued paths so a huge tree doesn't sit in the
+    # executor's queue while the walker races ahead of the hashers
+    in_flight = threading.BoundedSemaphore(workers * 4)
+
+    def hash_file(path, st):
+        try:
+            h = sha256_file(path, drop_cache=True)
             if h:
-                files.append((path, h))
+                files.append((path, h, stat_tag(st) if st is not None else 0))
+                if cache is not None and st is not None:
+                    cache.store(path, st, h)
             else:
                 inaccessible_files.append(path)
-    
+            progress.record(bool(h))
+        finally:
+            in_flight.release()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='FIMScan') as pool:
+        for path in iter_files(directory):
+            # Stat before hashing: the identity tag and cache fingerprint must
+            # never describe a newer file than the digest does
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if cache is not None and st is not None:
+                digest = cache.lookup(path, st)
+                if digest is not None:
+                    files.append((path, digest, stat_tag(st)))
+                    progress.record(True, cached=True)
+                    continue
+            in_flight.acquire()
+            pool.submit(hash_file, path, st)
+
+    progress.finish()
+    if cache is not None:
+        cache.save()
+
     if inaccessible_files and logger:
         logger.warning(f"{len(inaccessible_files)} files inaccessible")
         for f in inaccessible_files[:5]:
             logger.warning(f"  - {f}")
-    
-    return build_merkle_tree(files)
+
+    return build_merkle_tree(files, priority_key)
@@ -11,6 +11,7 @@ import logging
 import threading
 import requests
 import time
+import multiprocessing
 from multiprocessing.connection import Listener
 
 # Windows Service Imports
@@ -163,7 +164,16 @@ class FIMAdminDaemon:
             from core.state import FIMState
             from core.registration_client import RegistrationClient
 
-            self.state = FIMState(state_file, logger=self.logger)
+            self.state = FIMState(state_file, logger=self.logger,
+                                  commit_window=self.config.queue_commit_window,
+                                  commit_batch=self.config.queue_commit_batch,
+                                  backend=self.config.queue_backend,
+                                  memory_window=self.config.queue_memory_window,
+                                  verify_workers=self.config.queue_verify_workers,
+                                  key_type=self.config.device_key_type,
+                                  integrity=self.config.queue_integrity,
+                                  batch_events=self.config.queue_batch_sign_events,
+                                  batch_seconds=self.config.queue_batch_sign_seconds)
             cb = self._make_log_callback()
             self.conn_mgr = RegistrationClient(self.config, self.state, log_callback=cb)
 
@@ -172,9 +182,11 @@ class FIMAdminDaemon:
                 self.logger.warning('No watch directory configured; monitoring deferred until GUI sets one.')
                 # Re-check periodically until a directory is set
                 def _wait_for_dir():
+                    # Woken by the config watch; the timeout is the fallback poll without it
                     while self.running and not self._monitor_stop.is_set():
-                        import time
-                        time.sleep(5)
+                        watching = self.state.watch_system_config()
+                        self.state.config_changed.wait(60 if watching else 5)
+                        self.state.config_changed.clear()
                         wd = self.state.get_watch_directory()
                         if wd:
                             self._launch_monitor_thread(self.state, self.conn_mgr, wd)
@@ -309,9 +321,13 @@ class FIMAdminDaemon:
             return {"success": False, "error": "Missing credentials"}
             
         try:
-            import requests
-            response = requests.post(
-                f"{self.config.server_url}/api/clients/reregister",
+            if self.conn_mgr:
+                post = self.conn_mgr.http.post
+            else:
+                from core.http_session import HTTPSessionManager
+                post = HTTPSessionManager(self.config).post
+            response = post(
+                "/api/clients/reregister",
                 json={
                     'client_id': self.config.host_id,
                     'username': username,
@@ -363,8 +379,11 @@ class FIMAdminDaemon:
             self.logger.info(f"Generated Signature: {signature}")
             sys_config['_signature'] = signature
             
-            with open(self.sys_config_path, 'w') as f:
+            # Replace atomically so watchers never see a half-written config
+            tmp_path = self.sys_config_path + '.tmp'
+            with open(tmp_path, 'w') as f:
                 json.dump(sys_config, f, indent=2)
+            os.replace(tmp_path, self.sys_config_path)
             self.logger.info(f"Successfully updated system watch directory to: {new_path}")
             
             # Restart monitoring thread to pick up the new directory and trigger scan
@@ -673,6 +692,8 @@ def run_daemon():
     daemon.run()
 
 if __name__ == '__main__':
+    # Frozen builds: lets spawned queue verification workers start from this executable
+    multiprocessing.freeze_support()
     if sys.platform == 'win32':
         if len(sys.argv) > 1 and sys.argv[1] in ['install', 'update', 'remove', 'start', 'stop', 'restart', 'status']:
             win32serviceutil.HandleCommandLine(FIMAdminService)
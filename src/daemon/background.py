@@ -4,6 +4,7 @@ Background daemon loop for file integrity monitoring.
 Accepts a log_callback(msg: dict) instead of a gui_queue so it can run
 inside the admin service without depending on tkinter or a thread-safe queue.
 """
+import os
 import time
 import threading
 from datetime import datetime
@@ -12,12 +13,16 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 from core.tree_builder import build_initial_tree
+from core.hash_cache import HashCache
+from core.event_coalescer import EventCoalescer
+from core.change_pipeline import ChangePipeline
 from core.event_handler import FIMEventHandler
 from core.utils import ensure_directory
+from core.state import CHANGE_EVENTS
 
 
 class WatchdogFileHandler(FileSystemEventHandler):
-    """Watchdog event handler that delegates to FIMEventHandler."""
+    """Watchdog event handler that delegates to FIMEventHandler (or an EventCoalescer in front of it)."""
 
     def __init__(self, fim_handler):
         self.fim_handler = fim_handler
@@ -34,6 +39,26 @@ class WatchdogFileHandler(FileSystemEventHandler):
         if not event.is_directory:
             self.fim_handler.detect_file_change(event.src_path, is_deleted=True)
 
+    def on_moved(self, event):
+        self.fim_handler.detect_file_move(event.src_path, event.dest_path, is_directory=event.is_directory)
+
+
+class StateFileWatcher(FileSystemEventHandler):
+    """Runs the state.json tamper check as soon as the file changes on disk instead of at the next poll."""
+
+    def __init__(self, state, on_tamper):
+        self.state = state
+        self.state_file = os.path.abspath(state.state_file)
+        self.on_tamper = on_tamper
+
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS:
+            return  # opened/closed: our own reads
+        paths = (event.src_path, getattr(event, 'dest_path', None))
+        if self.state_file in (os.path.abspath(p) for p in paths if p):
+            if self.state.check_disk_tampering():
+                self.on_tamper()
+
 
 def _log(callback, message, status="info", timestamp=None):
     """Helper: invoke log_callback with a standard message dict."""
@@ -73,16 +98,47 @@ def run_daemon_background(config, state, conn_mgr, log_callback, watch_dir, stop
 
     # Build initial Merkle tree
     ensure_directory(watch_dir)
-    tree, files = build_initial_tree(watch_dir)
+    hash_cache = HashCache.for_state(state, logger=config.logger)
+    tree, files = build_initial_tree(watch_dir, logger=config.logger, log_callback=log_callback,
+                                     workers=config.scan_workers, cache=hash_cache,
+                                     priority_key=state.device_signer.derive_key(b'fim-merkle-priority'))
 
     # Set up event handling
     event_handler = FIMEventHandler(tree, files, config, state, conn_mgr, log_callback)
-    watchdog_handler = WatchdogFileHandler(event_handler)
+    pipeline = ChangePipeline(event_handler.file_monitor, watch_dir,
+                              workers=config.hash_workers,
+                              max_queue=config.change_queue_size,
+                              logger=config.logger).start()
+    coalescer = EventCoalescer(pipeline.submit_batch,
+                               quiet_window=config.event_quiet_window,
+                               logger=config.logger,
+                               move_sink=pipeline.detect_file_move).start()
+    watchdog_handler = WatchdogFileHandler(coalescer)
+
+    state_tamper = {'reported': False}
+
+    def report_state_tamper():
+        if not state_tamper['reported']:
+            state_tamper['reported'] = True
+            _log(log_callback, 'SECURITY ALERT: state.json was modified outside the FIM client.', 'error')
 
     observer = Observer()
     observer.schedule(watchdog_handler, watch_dir, recursive=True)
+    if config.state_tamper_watch:
+        observer.schedule(StateFileWatcher(state, report_state_tamper),
+                          os.path.dirname(os.path.abspath(state.state_file)), recursive=False)
     observer.start()
 
+    # Digests reused from the hash cache are rehashed in the background; any
+    # file whose content changed without touching its stat fingerprint is
+    # reported through the pipeline, whose committer keeps per-path order
+    if hash_cache.pending:
+        threading.Thread(
+            target=hash_cache.verify_pending,
+            args=(lambda path: pipeline.submit_batch([(path, False, False)]), stop_event),
+            daemon=True
+        ).start()
+
     _log(log_callback, f'Watching {len(files)} files in {watch_dir}', 'success')
     log_callback({'type': 'directory', 'directory': watch_dir})
 
@@ -97,7 +153,39 @@ def run_daemon_background(config, state, conn_mgr, log_callback, watch_dir, stop
     pulse_interval = 30
     last_heartbeat = 0
     last_pulse = 0
-    tamper_reported = False
+    config_tamper = {'reported': False}
+    config_lock = threading.Lock()
+
+    def check_system_config():
+        """Config tamper detection via watch_directory becoming None"""
+        with config_lock:
+            if state.get_watch_directory() is None:
+                if not config_tamper['reported']:
+                    _log(log_callback,
+                         'SECURITY ALERT: system_config.json compromised. '
+                         'Maintaining current valid state and syncing with server.',
+                         'error')
+                    current_hash = state.get_last_valid_hash()
+                    queued = state.enqueue_event({
+                        'client_id': config.host_id,
+                        'event_type': 'config_tampered',
+                        'file_path': 'C:/ProgramData/FIMClient/system_config.json',
+                        'old_hash': current_hash,
+                        'new_hash': current_hash,
+                        'root_hash': current_hash,
+                        'last_valid_hash': current_hash,
+                        'merkle_proof': None,
+                        'timestamp': datetime.now().isoformat()
+                    })
+                    if not queued:
+                        return  # not on disk; retried on the next check
+                    config_tamper['reported'] = True
+                    if conn_mgr.connected:
+                        threading.Thread(target=event_handler.process_event_queue, daemon=True).start()
+            else:
+                config_tamper['reported'] = False
+
+    state.watch_system_config(check_system_config)
 
     try:
         while True:
@@ -135,30 +223,14 @@ def run_daemon_background(config, state, conn_mgr, log_callback, watch_dir, stop
                 event_handler.send_heartbeat()
                 last_heartbeat = now
 
-            # Config tamper detection via watch_directory becoming None
-            if state.get_watch_directory() is None:
-                if not tamper_reported:
-                    _log(log_callback,
-                         'SECURITY ALERT: system_config.json compromised. '
-                         'Maintaining current valid state and syncing with server.',
-                         'error')
-                    current_hash = state.get_last_valid_hash()
-                    state.enqueue_event({
-                        'client_id': config.host_id,
-                        'event_type': 'config_tampered',
-                        'file_path': 'C:/ProgramData/FIMClient/system_config.json',
-                        'old_hash': current_hash,
-                        'new_hash': current_hash,
-                        'root_hash': current_hash,
-                        'last_valid_hash': current_hash,
-                        'merkle_proof': None,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                    tamper_reported = True
-                    if conn_mgr.connected:
-                        threading.Thread(target=event_handler.process_event_queue, daemon=True).start()
+            # Config tamper detection (cached; the config watch also runs it on change)
+            check_system_config()
+
+            # State file tamper detection: a stat comparison, rehashing only on change
+            if state.check_disk_tampering():
+                report_state_tamper()
             else:
-                tamper_reported = False
+                state_tamper['reported'] = False
 
             # Granular sleep (20 × 0.5 s = 10 s) for responsiveness to stop_event
             for _ in range(20):
@@ -169,5 +241,8 @@ def run_daemon_background(config, state, conn_mgr, log_callback, watch_dir, stop
     except KeyboardInterrupt:
         pass
     finally:
+        state.unwatch_system_config(check_system_config)
         observer.stop()
-        observer.join()
\ No newline at end of file
+        observer.join()
+        coalescer.stop()
+        pipeline.stop()
\ No newline at end of file
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Local checks for rename handling in the change pipeline (no server needed):
+a file renamed while its create is still being hashed, a directory move
+whose result reaches the committer after a newer change inside it, and a
+directory moved onto an already tracked destination.
+
+    python tests/check_pipeline_moves.py
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.merkle import MerkleTree
+from core.file_monitor import FileMonitor
+from core.change_pipeline import ChangePipeline, DIR_MOVE
+from core.utils import sha256_file, stat_tag
+
+
+class RecordingState:
+    """Just enough of FIMState for FileMonitor: remembers queued events"""
+
+    def __init__(self):
+        self.events = []
+
+    def enqueue_event(self, event, wait=True):
+        self.events.append(event)
+
+    def get_last_valid_hash(self):
+        return None
+
+    def flush_events(self, seal_batch=True):
+        pass
+
+    def get_queue_size(self):
+        return len(self.events)
+
+
+def make_pipeline(tree):
+    config = SimpleNamespace(host_id='check-client', logger=logging.getLogger('check'))
+    monitor = FileMonitor(tree, None, config, RecordingState(), lambda msg: None,
+                          SimpleNamespace(start_processing=lambda: None), threading.Lock())
+    return monitor, ChangePipeline(monitor, os.path.dirname(next(iter(tree))[0]) if len(tree) else '.',
+                                   workers=4)
+
+
+def settle(pipeline, timeout=10):
+    """Wait until every submitted change (including follow-ups) has committed, then stop"""
+    deadline = time.time() + timeout
+    while pipeline.outstanding and time.time() < deadline:
+        time.sleep(0.05)
+    pipeline.stop()
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def check_create_then_rename(work):
+    src, dest = os.path.join(work, 'new.txt'), os.path.join(work, 'renamed.txt')
+    monitor, pipeline = make_pipeline(MerkleTree())
+    hash_change = monitor.hash_change
+
+    def slow_hash(path, is_deleted):
+        time.sleep(0.3)  # the create is still hashing when the rename arrives
+        return hash_change(path, is_deleted)
+    monitor.hash_change = slow_hash
+    pipeline.start()
+
+    write(src, b'created')
+    pipeline.detect_file_change(src, is_new=True)
+    os.rename(src, dest)
+    pipeline.detect_file_move(src, dest)
+    settle(pipeline)
+
+    assert src not in monitor.tree
+    assert monitor.tree.get(dest) == sha256_file(dest), "renamed file is not tracked"
+    assert [e['file_path'] for e in monitor.state.events] == [dest]
+    print("SUCCESS: create then rename tracks the new name")
+
+
+def check_late_directory_move(work):
+    src, dest = os.path.join(work, 'a'), os.path.join(work, 'b')
+    write(os.path.join(src, 'x.txt'), b'before')
+    path = os.path.join(src, 'x.txt')
+    tree = MerkleTree.from_sorted([(path, sha256_file(path), stat_tag(os.stat(path)))])
+    monitor, pipeline = make_pipeline(tree)
+    put = pipeline.results.put
+
+    def late_dir_moves(item, *args, **kwargs):
+        if isinstance(item, tuple) and item[1] == DIR_MOVE:
+            time.sleep(0.3)  # the newer change finishes hashing first
+        put(item, *args, **kwargs)
+    pipeline.results.put = late_dir_moves
+    pipeline.start()
+
+    os.rename(src, dest)
+    pipeline.detect_file_move(src, dest, is_directory=True)
+    write(os.path.join(dest, 'x.txt'), b'after!')  # same size and inode: only a rehash notices
+    pipeline.detect_file_change(os.path.join(dest, 'x.txt'))
+    settle(pipeline)
+
+    assert os.path.join(src, 'x.txt') not in monitor.tree
+    assert monitor.tree.get(os.path.join(dest, 'x.txt')) == sha256_file(os.path.join(dest, 'x.txt')), \
+        "directory move overwrote a newer change"
+    print("SUCCESS: a late directory move does not undo newer changes")
+
+
+def check_move_onto_tracked(work):
+    fresh = hashlib.sha256(b'fresh').digest()
+    tree = MerkleTree.from_sorted([('/w/a/x', hashlib.sha256(b'old').digest()), ('/w/b/x', fresh)])
+    moved = tree.move_prefix('/w/a/', '/w/b/')
+    assert [new for _, new, _ in moved] == ['/w/b/x']
+    assert '/w/a/x' not in tree and tree.get('/w/b/x') == fresh, "destination leaf was overwritten"
+    print("SUCCESS: moving onto a tracked destination keeps its leaves")
+
+
+if __name__ == "__main__":
+    work = tempfile.mkdtemp(prefix='fim-check-')
+    try:
+        check_create_then_rename(os.path.join(work, '1'))
+        check_late_directory_move(os.path.join(work, '2'))
+        check_move_onto_tracked(work)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)